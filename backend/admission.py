@@ -0,0 +1,103 @@
+"""Admission control for the expensive routes.
+
+Each route in ROUTE_LIMITS may have at most that many requests in progress
+per worker process; a request beyond the limit is turned away at once with
+503 and Retry-After rather than queueing behind the others. Routes that are
+not listed (the dashboard counters) are never limited, so heavy exports
+cannot starve them. A slot is held until the last body byte is sent, so
+streamed exports count for their whole duration.
+
+A Mongo read stopped by its maxTimeMS budget (see mongodb.MAX_TIME_MS)
+becomes the same 503, as long as the response has not started yet.
+Rejections and timeouts are counted per route in metrics.py.
+"""
+import os
+
+from pymongo.errors import ExecutionTimeout
+
+from metrics import QUERY_TIMEOUTS, REJECTED_REQUESTS, RouteTemplates
+from responses import dumps
+
+RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+
+# Concurrent requests per route template and worker.
+ROUTE_LIMITS = {
+    "/api/theft-data": 4,
+    "/api/thefts-heatmap": 4,
+    "/api/thefts-heatmap/grid": 8,
+    "/api/thefts-within": 8,
+    "/api/thefts-near": 8,
+    "/api/generate-report": 4,
+    "/api/download/pdf": 2,
+}
+
+
+def _limits_from_env(value: str):
+    """Parse ROUTE_CONCURRENCY, e.g. /api/theft-data=8,/api/download/pdf=4;
+    a limit of 0 removes the route's limit."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        route, _, limit = item.rpartition("=")
+        limits[route] = int(limit)
+    return limits
+
+
+ROUTE_LIMITS.update(_limits_from_env(os.getenv("ROUTE_CONCURRENCY", "")))
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware; counters are plain ints since everything runs on
+    the event loop."""
+
+    def __init__(self, app, fastapi_app, limits=None):
+        self.app = app
+        self.routes = RouteTemplates(fastapi_app)
+        self.limits = {route: n for route, n in (limits or ROUTE_LIMITS).items() if n > 0}
+        self.active = dict.fromkeys(self.limits, 0)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = self.routes.resolve(scope["path"])
+        limit = self.limits.get(route)
+        if limit is not None and self.active[route] >= limit:
+            REJECTED_REQUESTS.labels(route).inc()
+            await _unavailable(send, "Too many concurrent requests for this endpoint, retry shortly")
+            return
+
+        started = False
+
+        async def send_wrapper(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        if limit is not None:
+            self.active[route] += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except ExecutionTimeout:
+            QUERY_TIMEOUTS.labels(route).inc()
+            if started:
+                raise
+            await _unavailable(send, "Query exceeded its time budget; narrow the filters or retry")
+        finally:
+            if limit is not None:
+                self.active[route] -= 1
+
+
+async def _unavailable(send, detail: str):
+    body = dumps({"detail": detail})
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(RETRY_AFTER_SECONDS).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,254 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from cache import canonical_key, result_cache
+from columnar import columnar_engine
+from mongodb import MAX_TIME_MS, get_database, get_thefts_collection
+from rollup import choose_cube, cube_collection, rollup_query, rollup_state
+from singleflight import single_flight
+
+TIME_SLOTS = ("Morning", "Afternoon", "Evening", "Midnight")
+
+
+# One sub-pipeline per dashboard widget. They all run behind a single
+# {"$match": query} so a page view scans the collection once.
+FACETS = {
+    "total_thefts": [
+        {"$count": "count"}
+    ],
+    "highest_police_station": [
+        {"$group": {"_id": "$POLICE_STATION", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": 1}
+    ],
+    "most_model": [
+        {"$group": {"_id": "$MAKE", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": 5}
+    ],
+    "peak_time": [
+        {"$group": {"_id": "$Time_of_day", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": 1}
+    ],
+    "thefts_by_ps": [
+        {"$group": {
+            "_id": {"$ifNull": ["$POLICE_STATION", "Unknown"]},
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"count": -1}}
+    ],
+    "time_slot_by_company": [
+        {"$group": {
+            "_id": {"company": "$MAKE", "Time_slot": "$Time_of_day"},
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"_id.company": 1}}
+    ],
+    "thefts_company": [
+        {"$group": {"_id": "$Make", "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}}
+    ],
+}
+
+# The fields each facet groups on, for picking a rollup cube.
+FACET_FIELDS = {
+    "total_thefts": (),
+    "highest_police_station": ("POLICE_STATION",),
+    "most_model": ("MAKE",),
+    "peak_time": ("Time_of_day",),
+    "thefts_by_ps": ("POLICE_STATION",),
+    "time_slot_by_company": ("MAKE", "Time_of_day"),
+    "thefts_company": ("Make",),
+}
+
+
+def rollup_stages(stages):
+    """Rewrite facet stages to run over the rollup, where each row stands for
+    "count" thefts instead of one."""
+    def weigh(node):
+        if node == {"$sum": 1}:
+            return {"$sum": "$count"}
+        if node == {"$count": "count"}:
+            return {"$group": {"_id": None, "count": {"$sum": "$count"}}}
+        if isinstance(node, dict):
+            return {k: weigh(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [weigh(v) for v in node]
+        return node
+    return weigh(stages)
+
+
+ROLLUP_FACETS = {name: rollup_stages(stages) for name, stages in FACETS.items()}
+
+
+def _shape_total_thefts(rows):
+    return {"total_thefts": rows[0]["count"] if rows else 0}
+
+
+def _shape_highest_police_station(rows):
+    if rows:
+        return {"station": rows[0]["_id"], "thefts": rows[0]["count"]}
+    return {"station": "N/A", "thefts": 0}
+
+
+def _shape_most_model(rows):
+    return {"data": [{"model": r["_id"], "count": r["count"]} for r in rows]}
+
+
+def _shape_peak_time(rows):
+    if rows:
+        return {"time_slot": rows[0].get("_id"), "time": rows[0].get("count", 0)}
+    return {"time_slot": None, "time": 0}
+
+
+def _shape_thefts_by_ps(rows):
+    return {"data": [{"locality": r["_id"], "count": r["count"]} for r in rows]}
+
+
+def _shape_time_slot_by_company(rows):
+    data = {}
+    for r in rows:
+        company_name = r["_id"].get("company", "Unknown")
+        period = r["_id"].get("Time_slot", "Unknown")
+
+        if company_name not in data:
+            data[company_name] = {slot: 0 for slot in TIME_SLOTS}
+
+        if period in data[company_name]:
+            data[company_name][period] = r.get("count", 0)
+
+    return {"data": [{"company": k, **v} for k, v in data.items()]}
+
+
+def _shape_thefts_company(rows):
+    return {"data": [{"company": r["_id"], "count": r["count"]} for r in rows]}
+
+
+SHAPERS = {
+    "total_thefts": _shape_total_thefts,
+    "highest_police_station": _shape_highest_police_station,
+    "most_model": _shape_most_model,
+    "peak_time": _shape_peak_time,
+    "thefts_by_ps": _shape_thefts_by_ps,
+    "time_slot_by_company": _shape_time_slot_by_company,
+    "thefts_company": _shape_thefts_company,
+}
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+def _source(cubes):
+    if None not in cubes:
+        return "rollup"
+    return "raw" if set(cubes) == {None} else "rollup+raw"
+
+
+def _plan_target(query, cube):
+    """(collection, $match, facet stages) for a cube, or the raw collection."""
+    if cube is None:
+        return get_thefts_collection(), query, FACETS
+    return get_database()[cube_collection(cube)], rollup_query(query), ROLLUP_FACETS
+
+
+async def run_facets(query: dict, names: Optional[List[str]] = None, profile: bool = False) -> Dict:
+    """Run the requested widgets as $facet aggregations.
+
+    Returns {"data": {name: payload}, "cached": [...], "source": ...,
+    "timings_ms": {...}}. While the rollup is current each widget is answered
+    from the smallest cube covering the filters and its grouping (see
+    rollup.choose_cube), one aggregation per cube, and the rest from the raw
+    collection in one more. "source" is "columnar" when the in-process
+    snapshot answered, else "rollup", "raw" or "rollup+raw". Widgets found in
+    the result cache are listed under "cached" and left out of the
+    aggregation. "aggregate" is the Mongo round trips, run concurrently, and
+    "shape" the per-widget post-processing. profile=True bypasses the cache
+    and also runs every facet as its own pipeline, timed under "facets"; that
+    costs one extra scan per widget and is meant for debugging.
+    """
+    names = list(names or FACETS)
+    unknown = [n for n in names if n not in FACETS]
+    if unknown:
+        raise ValueError(f"Unknown dashboard facet(s): {', '.join(unknown)}")
+
+    # Read before anything is computed: results are cached under the version
+    # of the data they came from, even if a reload lands meanwhile.
+    version = await result_cache.dataset_version()
+    if await rollup_state.is_current():
+        plan = {name: choose_cube(query, FACET_FIELDS[name]) for name in names}
+    else:
+        plan = dict.fromkeys(names)
+
+    timings = {}
+    data = {}
+    cached = []
+    if not profile:
+        for name in names:
+            found, payload = await result_cache.lookup(name, query)
+            if found:
+                data[name] = payload
+                cached.append(name)
+
+    source = _source([plan[name] for name in names])
+    missing = [name for name in names if name not in data]
+    if missing:
+        start = time.perf_counter()
+
+        async def run(cube, group):
+            collection, match, facets = _plan_target(query, cube)
+            pipeline = [
+                {"$match": match},
+                {"$facet": {name: facets[name] for name in group}}
+            ]
+            cursor = await collection.aggregate(pipeline, maxTimeMS=MAX_TIME_MS)
+            result = await cursor.to_list()
+            return result[0] if result else {}
+
+        async def compute():
+            snapshot = None if profile else await columnar_engine.current()
+            rows = columnar_engine.facet_rows(snapshot, query, missing) if snapshot else None
+            if rows is not None:
+                return "columnar", rows
+            groups = {}
+            for name in missing:
+                groups.setdefault(plan[name], []).append(name)
+            results = await asyncio.gather(*(run(cube, group) for cube, group in groups.items()))
+            return _source(list(groups)), {name: rows for result in results for name, rows in result.items()}
+
+        if profile:
+            source, rows_by_facet = await compute()
+        else:
+            # Identical dashboards requested at the same moment share one
+            # computation.
+            key = f"{version}:{canonical_key('facets', query, sorted(missing))}"
+            route = missing[0] if len(names) == 1 else "dashboard"
+            source, rows_by_facet = await single_flight.do(route, key, compute)
+        timings["aggregate"] = _elapsed_ms(start)
+
+        shape_timings = {}
+        for name in missing:
+            start = time.perf_counter()
+            data[name] = SHAPERS[name](rows_by_facet.get(name, []))
+            shape_timings[name] = _elapsed_ms(start)
+            result_cache.store(name, query, data[name], version)
+        timings["shape"] = shape_timings
+
+    if profile:
+        facet_timings = {}
+        for name in names:
+            collection, match, facets = _plan_target(query, plan[name])
+            start = time.perf_counter()
+            cursor = await collection.aggregate([{"$match": match}, *facets[name]], maxTimeMS=MAX_TIME_MS)
+            await cursor.to_list()
+            facet_timings[name] = _elapsed_ms(start)
+        timings["facets"] = facet_timings
+
+    return {"data": {name: data[name] for name in names}, "cached": cached, "source": source, "timings_ms": timings}
+
+
+async def facet_view(name: str, query: dict):
+    """Payload of a single widget, for the legacy per-widget routes."""
+    return (await run_facets(query, [name]))["data"][name]
@@ -0,0 +1,22 @@
+"""Benchmarks and load tests for the API. Run from backend/:
+
+    python -m benchmarks.synthetic --rows 100000 --csv thefts_100k.csv
+    python -m benchmarks.micro --rows 100000 [--standin] [--json out.json] [--compare base.json]
+    python -m benchmarks.load --rows 100000 --concurrency 32 --duration 30 [--standin | --url URL]
+    python -m benchmarks.startup [--budget-ms 1000]
+
+Data is generated from a fixed seed, so two runs at the same --rows/--seed
+measure the same dataset. It is written to the "theft_db_bench" database
+(override with BENCH_MONGO_DB; MONGO_DB is ignored, so an exported
+development setting cannot redirect it) on MONGO_URI. Loading also refuses
+to replace a thefts collection that holds data but was not written by these
+benchmarks.
+--standin replaces Mongo with an in-process mongomock adapter; it needs no
+server but does not implement every aggregation operator, so routes that
+depend on those are reported as skipped. Compare numbers only between runs
+with the same backend, rows and seed.
+"""
+import os
+
+BENCH_MONGO_DB = os.getenv("BENCH_MONGO_DB", "theft_db_bench")
+os.environ["MONGO_DB"] = BENCH_MONGO_DB
@@ -0,0 +1,78 @@
+import contextlib
+import json
+import statistics
+
+import httpx
+
+# Filters the benchmarks send, from "no filter" to the combinations the
+# dashboard sidebar produces.
+FILTERS = {
+    "all": {},
+    "station": {"localities": "KARVIR"},
+    "stations_time": {"localities": "KARVIR,KAGAL,SHIROL", "time_of_day": "Midnight"},
+    "company_days": {"company": "HONDA", "days": "SATURDAY,SUNDAY"},
+    "many": {"localities": "KARVIR,KAGAL", "categories": "Scooter", "spot_types": "ROAD,PARKING,MARKET"},
+}
+
+
+def add_backend_args(parser):
+    parser.add_argument("--standin", action="store_true",
+                        help="use the in-process mongomock stand-in instead of MONGO_URI")
+
+
+def prepare(args):
+    """Point the app at the chosen backend and make sure the dataset is loaded."""
+    if args.standin:
+        from benchmarks import standin
+        standin.install()
+    from benchmarks.synthetic import ensure_dataset
+    # The stand-in cannot run the rollup build ($dateTrunc).
+    ensure_dataset(args.rows, args.seed, rollup=not args.standin)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(durations_ms):
+    values = sorted(durations_ms)
+    return {
+        "n": len(values),
+        "min": round(values[0], 3) if values else 0.0,
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "mean": round(statistics.fmean(values), 3) if values else 0.0,
+    }
+
+
+@contextlib.asynccontextmanager
+async def http_client(url=None, timeout=60.0):
+    """Client for a running server at url, or the app in-process (lifespan included)."""
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            yield client
+        return
+
+    from main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+            yield client
+
+
+def write_json(path, payload):
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2, default=str)
+
+
+def print_table(rows, columns):
+    widths = [max(len(str(c)), *(len(str(r.get(c, ""))) for r in rows)) for c in columns]
+    print("  ".join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(w) for c, w in zip(columns, widths)))
@@ -0,0 +1,114 @@
+"""Concurrent HTTP load driver.
+
+    python -m benchmarks.load [--rows 100000] [--seed 42] [--standin]
+        [--url http://localhost:8000] [--concurrency 32] [--duration 30]
+        [--route dashboard --route theft-data ...] [--json out.json]
+
+Each worker sends requests back to back, picking a route and a filter from
+a seeded random sequence. Without --url the app runs in-process, sharing an
+event loop with the workers; to measure a deployment, start uvicorn against
+the benchmark database and pass --url. Reports requests/sec and p50/p95/p99
+latency overall and per route.
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+from benchmarks.common import FILTERS, add_backend_args, http_client, prepare, print_table, summarize, write_json
+from benchmarks.synthetic import add_dataset_args
+
+# (name, method, path, extra params, weight): roughly what a dashboard
+# session sends.
+ROUTES = [
+    ("dashboard", "GET", "/api/dashboard", {}, 6),
+    ("total-thefts", "GET", "/api/total-thefts", {}, 2),
+    ("thefts-by-ps", "GET", "/api/thefts-by-ps", {}, 2),
+    ("Time_slot-by-company", "GET", "/api/Time_slot-by-company", {}, 2),
+    ("theft-data", "GET", "/api/theft-data", {"limit": 500}, 3),
+    ("thefts-heatmap/grid", "GET", "/api/thefts-heatmap/grid", {}, 2),
+    ("thefts-heatmap", "GET", "/api/thefts-heatmap", {}, 1),
+    ("generate-report", "POST", "/api/generate-report", {"police_station": "KARVIR"}, 1),
+]
+
+
+async def worker(client, routes, rng, deadline, samples):
+    names = [r[0] for r in routes]
+    weights = [r[4] for r in routes]
+    filters = list(FILTERS.values())
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        _, method, path, extra, _ = next(r for r in routes if r[0] == name)
+        params = {**rng.choice(filters), **extra}
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, params=params)
+            status = response.status_code
+        except Exception:
+            status = "error"
+        samples.append((name, status, (time.perf_counter() - start) * 1000))
+
+
+async def run(args, routes):
+    samples = []
+    async with http_client(args.url) as client:
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            worker(client, routes, random.Random(args.seed * 1000 + i), deadline, samples)
+            for i in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+def report(samples, elapsed):
+    by_route = defaultdict(list)
+    errors = defaultdict(int)
+    # 503s are load shedding by the admission limits, not failures.
+    shed = defaultdict(int)
+    for name, status, ms in samples:
+        by_route[name].append(ms)
+        if status == 503:
+            shed[name] += 1
+        elif status == "error" or status >= 400:
+            errors[name] += 1
+
+    rows = [{"route": "ALL", **summarize([s[2] for s in samples]),
+             "rps": round(len(samples) / elapsed, 1), "errors": sum(errors.values()), "shed": sum(shed.values())}]
+    for name, durations in sorted(by_route.items()):
+        rows.append({"route": name, **summarize(durations),
+                     "rps": round(len(durations) / elapsed, 1), "errors": errors[name], "shed": shed[name]})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_dataset_args(parser)
+    add_backend_args(parser)
+    parser.add_argument("--url", help="base URL of a running server (default: in-process app)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--route", action="append", choices=[r[0] for r in ROUTES],
+                        help="restrict the mix to these routes (repeatable)")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    if not args.url:
+        prepare(args)
+    routes = [r for r in ROUTES if not args.route or r[0] in args.route]
+    samples, elapsed = asyncio.run(run(args, routes))
+    rows = report(samples, elapsed)
+    print(f"{len(samples)} requests in {elapsed:.1f}s with {args.concurrency} workers")
+    print_table(rows, ["route", "n", "rps", "p50", "p95", "p99", "mean", "errors", "shed"])
+
+    if args.json:
+        write_json(args.json, {
+            "rows": args.rows, "seed": args.seed, "concurrency": args.concurrency,
+            "duration": args.duration, "target": args.url or "in-process", "results": rows,
+        })
+
+
+if __name__ == "__main__":
+    main()
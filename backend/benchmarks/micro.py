@@ -0,0 +1,178 @@
+"""Per-handler micro-benchmarks.
+
+    python -m benchmarks.micro [--rows 100000] [--seed 42] [--standin]
+        [--only dashboard] [--min-time 1.0] [--json out.json] [--compare base.json]
+
+Pure functions (filter parsing, heatmap and PDF rendering) are timed
+directly. Every route in theft.py is timed as a single in-process HTTP
+request with the result and page caches cleared first, so each iteration
+does the full work; "dashboard_warm" shows the cached path for contrast.
+Times are milliseconds.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+from starlette.requests import Request
+
+from benchmarks.common import FILTERS, add_backend_args, http_client, prepare, print_table, summarize, write_json
+from benchmarks.synthetic import add_dataset_args, generate_chunk
+
+PDF_CASES = 200
+# Roughly one police station's area around Kolhapur city.
+VIEWPORT = {"min_lat": 16.65, "min_lon": 74.18, "max_lat": 16.75, "max_lon": 74.30}
+NEAR = {"lat": 16.705, "lon": 74.243, "radius_m": 2000}
+HEATMAP_SAMPLE_ROWS = 100_000
+
+
+def _sample_points(seed):
+    from heatmap import DEFAULT_CELL as cell
+
+    frame = generate_chunk(seed, 0, HEATMAP_SAMPLE_ROWS)
+    bins = np.floor(frame[["LATITUDE", "LONGITUDE"]].to_numpy() / cell)
+    cells, weights = np.unique(bins, axis=0, return_counts=True)
+    centres = cells * cell + cell / 2
+    return [[round(la, 6), round(lo, 6), int(w)] for (la, lo), w in zip(centres, weights)]
+
+
+def _sample_cases(seed):
+    frame = generate_chunk(seed, 0, PDF_CASES)
+    frame = frame.assign(DATE=frame["DATE"].dt.strftime("%Y-%m-%d"))
+    return frame.to_dict(orient="records")
+
+
+def _reset_caches():
+    from cache import result_cache
+    from heatmap import page_cache
+    result_cache.invalidate()
+    page_cache.clear()
+
+
+def build_benchmarks(client, seed):
+    """name -> (callable returning an awaitable or a value, reset before each run?)."""
+    from heatmap import render_heatmap
+    from pdf_export import render_cases_pdf
+    from theft import build_filter_query, filter_params
+
+    request = Request({"type": "http", "query_string": b""})
+    points = _sample_points(seed)
+    cases = _sample_cases(seed)
+    station = FILTERS["station"]
+
+    async def get(path, params=None):
+        response = await client.get(path, params=params)
+        response.raise_for_status()
+        return response.content
+
+    async def post(path, params=None, body=None):
+        response = await client.post(path, params=params, json=body)
+        response.raise_for_status()
+        return response.content
+
+    benches = {
+        "build_filter_query": (lambda: build_filter_query(
+            localities=["KARVIR", "KAGAL"], company="HONDA", time_of_day="Midnight",
+            days=["SATURDAY", "SUNDAY"], spot_types=["ROAD"]), False),
+        "filter_params": (lambda: filter_params(request, **{
+            "date_from": None, "date_to": None, "localities": None, "places": None, "company": None, "categories": None,
+            "time_of_day": None, "days": None, "spot_types": None, **FILTERS["many"]}), False),
+        "render_heatmap": (lambda: render_heatmap(points), False),
+        "render_cases_pdf": (lambda: render_cases_pdf(cases), False),
+    }
+    for name, params in FILTERS.items():
+        benches[f"dashboard[{name}]"] = (lambda p=params: get("/api/dashboard", p), True)
+    benches["dashboard_warm"] = (lambda: get("/api/dashboard", station), False)
+    for path in ("total-thefts", "higest-police-station", "most-model", "peak-time",
+                 "thefts-by-ps", "Time_slot-by-company", "thefts-company"):
+        benches[path] = (lambda p=path: get(f"/api/{p}", station), True)
+    benches.update({
+        "theft-data[json,limit=500]": (lambda: get("/api/theft-data", {**station, "limit": 500}), True),
+        "theft-data[ndjson]": (lambda: get("/api/theft-data", {**station, "format": "ndjson"}), True),
+        "theft-data[csv]": (lambda: get("/api/theft-data", {**station, "format": "csv"}), True),
+        "thefts-heatmap/grid": (lambda: get("/api/thefts-heatmap/grid", station), True),
+        "thefts-heatmap/grid[viewport]": (lambda: get("/api/thefts-heatmap/grid", VIEWPORT), True),
+        "thefts-within": (lambda: get("/api/thefts-within", {**VIEWPORT, "limit": 1000}), False),
+        "thefts-near": (lambda: get("/api/thefts-near", {**NEAR, "limit": 100}), False),
+        "cases/{case_no}": (lambda: get("/api/cases/BT00000042"), False),
+        "cases/search[prefix]": (lambda: get("/api/cases/search", {"case_no_prefix": "BT000001", "limit": 50}), False),
+        "cases/search[q]": (lambda: get("/api/cases/search", {"q": "HONDA", "limit": 50}), False),
+        "thefts-heatmap": (lambda: get("/api/thefts-heatmap", station), True),
+        "generate-report": (lambda: post("/api/generate-report", {"police_station": "KARVIR"}), True),
+        "download/pdf": (lambda: post("/api/download/pdf", body=cases), False),
+    })
+    return benches
+
+
+async def _call(fn):
+    result = fn()
+    if asyncio.iscoroutine(result):
+        result = await result
+    return result
+
+
+async def time_benchmark(fn, reset, min_time, max_iterations):
+    await _call(fn)  # warm-up, also surfaces errors before timing
+    durations = []
+    deadline = time.perf_counter() + min_time
+    while len(durations) < max_iterations and (len(durations) < 3 or time.perf_counter() < deadline):
+        if reset:
+            _reset_caches()
+        start = time.perf_counter()
+        await _call(fn)
+        durations.append((time.perf_counter() - start) * 1000)
+    return summarize(durations)
+
+
+async def run(args):
+    results = {}
+    async with http_client() as client:
+        benches = build_benchmarks(client, args.seed)
+        for name, (fn, reset) in benches.items():
+            if args.only and not any(o in name for o in args.only):
+                continue
+            try:
+                results[name] = await time_benchmark(fn, reset, args.min_time, args.max_iterations)
+            except Exception as e:
+                results[name] = {"skipped": f"{type(e).__name__}: {e}"[:120]}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_dataset_args(parser)
+    add_backend_args(parser)
+    parser.add_argument("--only", action="append", help="run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to spend per benchmark")
+    parser.add_argument("--max-iterations", type=int, default=1000)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="earlier --json output to compare p50 against")
+    args = parser.parse_args(argv)
+
+    prepare(args)
+    results = asyncio.run(run(args))
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get("results", {})
+
+    rows = []
+    for name, stats in results.items():
+        row = {"benchmark": name, **stats}
+        base = baseline.get(name, {}).get("p50")
+        if base and "p50" in stats:
+            row["vs_base"] = f"{(stats['p50'] - base) / base * 100:+.1f}%"
+        rows.append(row)
+    columns = ["benchmark", "n", "min", "p50", "p95", "mean"] + (["vs_base"] if baseline else []) + ["skipped"]
+    print_table(rows, columns)
+
+    if args.json:
+        write_json(args.json, {
+            "rows": args.rows, "seed": args.seed, "backend": "standin" if args.standin else "mongod",
+            "results": results,
+        })
+
+
+if __name__ == "__main__":
+    main()
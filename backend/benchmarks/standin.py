@@ -0,0 +1,121 @@
+"""In-process Mongo stand-in: mongomock behind the async client interface.
+
+install() points mongodb.py's clients at one shared mongomock instance, so
+the app and the data loader see the same data without a server. Operations
+are synchronous under the hood; the numbers measure the application, not a
+database.
+"""
+import mongomock
+import mongomock.collection
+
+import mongodb
+
+# Driver options mongomock does not know about.
+_IGNORED_OPTIONS = ("max_time_ms", "maxTimeMS", "batch_size", "allowDiskUse", "comment", "hint")
+
+
+def _strip(kwargs):
+    for name in _IGNORED_OPTIONS:
+        kwargs.pop(name, None)
+    return kwargs
+
+
+class AsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        return list(self._cursor)
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, n):
+        self._cursor = self._cursor.limit(n)
+        return self
+
+    def skip(self, n):
+        self._cursor = self._cursor.skip(n)
+        return self
+
+    async def close(self):
+        pass
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self._collection = collection
+        self.name = collection.name
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self._collection.find(*args, **_strip(kwargs)))
+
+    async def aggregate(self, *args, **kwargs):
+        return AsyncCursor(iter(list(self._collection.aggregate(*args, **_strip(kwargs)))))
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **_strip(kwargs))
+        return call
+
+
+class AsyncDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getitem__(self, name):
+        return AsyncCollection(self._database[name])
+
+    async def command(self, *args, **kwargs):
+        return self._database.command(*args, **kwargs)
+
+
+class AsyncClient:
+    def __init__(self, shared):
+        self._shared = shared
+
+    def __getitem__(self, name):
+        return AsyncDatabase(self._shared[name])
+
+    async def close(self):
+        pass
+
+
+def _patch_bulk_update():
+    # mongomock's bulk UpdateOne/ReplaceOne do not accept the "sort" argument
+    # newer PyMongo versions pass along.
+    builder = mongomock.collection.BulkOperationBuilder
+    original_update = builder.add_update
+    original_replace = builder.add_replace
+
+    def add_update(self, selector, doc, multi=False, upsert=False, collation=None,
+                   array_filters=None, hint=None, **_):
+        return original_update(self, selector, doc, multi, upsert, collation=collation,
+                               array_filters=array_filters, hint=hint)
+
+    def add_replace(self, selector, doc, upsert, collation=None, hint=None, **_):
+        return original_replace(self, selector, doc, upsert, collation=collation, hint=hint)
+
+    builder.add_update = add_update
+    builder.add_replace = add_replace
+
+
+def install():
+    shared = mongomock.MongoClient()
+    _patch_bulk_update()
+    mongodb.AsyncMongoClient = lambda *args, **kwargs: AsyncClient(shared)
+    mongodb.MongoClient = lambda *args, **kwargs: shared
+    mongodb._client = mongodb._sync_client = None
+    return shared
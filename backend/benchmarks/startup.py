@@ -0,0 +1,109 @@
+"""Import-time budget for the API app.
+
+    python -m benchmarks.startup [--runs 7] [--budget-ms 1000] [--top 10] [--json out.json]
+
+Each run imports main in a fresh interpreter, which is what a new uvicorn
+worker pays before its lifespan starts, and the median is checked against
+--budget-ms. Modules that must stay lazily imported (LAZY_MODULES) are
+checked too. One extra run with -X importtime lists the most expensive
+top-level imports. The exit status is 1 when the budget is exceeded or a
+lazy module was imported, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.common import print_table, write_json
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Only the heatmap, PDF and columnar paths use these; they are imported on
+# first use.
+LAZY_MODULES = ("pandas", "folium", "fpdf", "numpy")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({"ms": elapsed, "modules": sorted(m for m in %r if m in sys.modules)}))
+""" % (LAZY_MODULES,)
+
+
+def _probe(*flags):
+    # ANALYTICS_ENGINE=columnar legitimately imports numpy at start.
+    env = {**os.environ, "ANALYTICS_ENGINE": "mongo"}
+    return subprocess.run(
+        [sys.executable, *flags, "-c", PROBE], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    )
+
+
+def import_time_ms():
+    result = json.loads(_probe().stdout)
+    return result["ms"], result["modules"]
+
+
+def top_imports(limit):
+    """[(module, cumulative ms)] for the modules main imports directly."""
+    entries = []
+    for line in _probe("-X", "importtime").stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2]
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, name.strip(), int(parts[1]) / 1000))
+
+    # importtime lists children before their parent: main's direct imports
+    # are the depth-1 entries since the previous top-level one.
+    end = next(i for i, (depth, name, _) in enumerate(entries) if depth == 0 and name == "main")
+    start = max((i for i in range(end) if entries[i][0] == 0), default=-1) + 1
+    rows = [(name, ms) for depth, name, ms in entries[start:end] if depth == 1]
+    return sorted(rows, key=lambda r: -r[1])[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7, help="fresh interpreters to time")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1000")),
+                        help="maximum median import time of main (default $IMPORT_BUDGET_MS or 1000)")
+    parser.add_argument("--top", type=int, default=10, help="expensive imports to list")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    timings, loaded = [], set()
+    for _ in range(args.runs):
+        ms, modules = import_time_ms()
+        timings.append(ms)
+        loaded.update(modules)
+    median = statistics.median(timings)
+    top = top_imports(args.top)
+
+    print_table([{"module": name, "cumulative_ms": round(ms, 1)} for name, ms in top], ["module", "cumulative_ms"])
+    print(f"\nimport main: median {median:.0f} ms, min {min(timings):.0f} ms over {args.runs} runs "
+          f"(budget {args.budget_ms:.0f} ms)")
+
+    failures = []
+    if median > args.budget_ms:
+        failures.append(f"median import time {median:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    if loaded:
+        failures.append(f"lazily loaded modules imported at startup: {', '.join(sorted(loaded))}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+    if args.json:
+        write_json(args.json, {
+            "median_ms": round(median, 1), "runs_ms": [round(t, 1) for t in timings],
+            "budget_ms": args.budget_ms, "lazy_modules_loaded": sorted(loaded),
+            "top_imports": [{"module": name, "cumulative_ms": round(ms, 1)} for name, ms in top],
+        })
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Seeded synthetic theft records with the real field names and vocabulary.
+
+    python -m benchmarks.synthetic --rows 1000000 --csv thefts_1m.csv
+    python -m benchmarks.synthetic --rows 1000000 --load
+
+--csv writes a file in the shape mongoscript.py ingests (text dates and
+coordinates); --load inserts typed documents straight into the benchmark
+database, as mongoscript.py would store them.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from cleaning import to_documents
+from heatmap import MAP_CENTER
+from mongodb import bump_dataset_version, get_sync_database
+
+# Rows are generated in fixed-size chunks, each from its own child seed, so
+# the first N rows are identical whatever the total --rows is.
+CHUNK_ROWS = 100_000
+MAX_ROWS = 10_000_000
+BENCHMARK_META_ID = "benchmark_dataset"
+
+POLICE_STATIONS = [
+    "AJARA", "BHUDARGAD", "CHANDGAD", "GADHINGLAJ", "GAGAN BAWADA",
+    "GANDHINAGAR", "GOKUL SHIRGAON", "HATKANAGALE", "HUPARI", "ICHALKARANJI",
+    "ISPURLI", "JAYSINGPUR", "JUNA RAJWADA", "KAGAL", "KALE", "KARVIR",
+    "KODOLI", "KURUNDVAD", "LAXMIPURI", "MURGUD", "PANHALA", "RADHANAGARI",
+    "RAJARAMPURI", "SHAHAPUR", "SHAHUPURI", "SHAHUWADI", "SHIROL", "SHIROLI MIDC",
+    "SHIVAJINAGAR", "VADGAON",
+]
+PLACES = [
+    "KOLHAPUR", "ICHALKARANJI", "GADHINGLAJ", "KAGAL", "HATKANAGALE",
+    "JAYSINGPUR", "SHAHAPUR", "GOKUL SHIRGAON", "AJARA", "BHUDARGAD",
+    "CHANDGAD", "HUPARI", "KARVIR", "KODOLI", "PANHALA",
+]
+MODELS = {
+    "HERO": ["SPLENDOR", "PASSION", "HF DELUXE", "GLAMOUR"],
+    "HONDA": ["ACTIVA", "SHINE", "UNICORN", "DIO"],
+    "BAJAJ": ["PULSAR", "PLATINA", "CT 100", "AVENGER"],
+    "TVS": ["JUPITER", "APACHE", "XL 100", "STAR CITY"],
+    "YAMAHA": ["FZ", "R15", "FASCINO", "RAY ZR"],
+    "SUZUKI": ["ACCESS", "GIXXER", "BURGMAN"],
+    "ROYAL ENFIELD": ["CLASSIC 350", "BULLET 350"],
+    "KTM": ["DUKE 200", "RC 390"],
+    "KAWASAKI": ["NINJA 300"],
+    "VESPA": ["VXL 125"],
+}
+SCOOTER_MODELS = {"ACTIVA", "DIO", "JUPITER", "FASCINO", "RAY ZR", "ACCESS", "BURGMAN", "VXL 125"}
+TIME_OF_DAY = ["Morning", "Afternoon", "Evening", "Midnight"]
+SPOTS = [
+    "ROAD", "HOME", "NEAR TEMPLE", "PARKING", "ON ROAD", "FARM", "SHOP",
+    "HOTEL", "TEMPLE", "ST STAND", "BANK", "HOSPITAL", "SCHOOL", "CHOWK",
+    "COLONEY", "MARKET", "SOCIETY", "GROUND", "LOAGE", "FARM ROAD", "BLOOD BANK",
+    "COMPANI", "INDASTRI", "MIDC", "ATM", "MANDIR", "COLLAGE", "COURT PARKING",
+    "PUBLIC PLACE", "HAWKERS ZONE",
+]
+STATUSES = ["UNDETECTED", "DETECTED"]
+DATE_START = np.datetime64("2019-01-01")
+DATE_DAYS = 6 * 365
+
+
+def _zipf(n, skew=0.9):
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return weights / weights.sum()
+
+
+def _station_centres(seed):
+    # Stations sit within ~0.5° of the map centre, fixed per seed.
+    rng = np.random.default_rng([seed, 0])
+    return np.asarray(MAP_CENTER) + rng.uniform(-0.5, 0.5, size=(len(POLICE_STATIONS), 2))
+
+
+def generate_chunk(seed: int, chunk_no: int, rows: int) -> pd.DataFrame:
+    """Rows chunk_no * CHUNK_ROWS onwards, typed as mongoscript stores them."""
+    rng = np.random.default_rng([seed, chunk_no + 1])
+    station = rng.choice(len(POLICE_STATIONS), size=rows, p=_zipf(len(POLICE_STATIONS)))
+    centres = _station_centres(seed)[station]
+    coords = centres + rng.normal(0, 0.03, size=(rows, 2))
+
+    makes = list(MODELS)
+    make = rng.choice(len(makes), size=rows, p=_zipf(len(makes), 1.2))
+    # Pick a model within each row's make from one flat model table.
+    flat = np.array([m for k in makes for m in MODELS[k]], dtype=object)
+    sizes = np.array([len(MODELS[k]) for k in makes])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    model = flat[offsets[make] + (rng.random(rows) * sizes[make]).astype(int)]
+
+    dates = DATE_START + rng.integers(0, DATE_DAYS, size=rows).astype("timedelta64[D]")
+    dates = pd.to_datetime(dates)
+    first = chunk_no * CHUNK_ROWS
+
+    return pd.DataFrame({
+        "CaseNo": [f"BT{first + i:08d}" for i in range(rows)],
+        "POLICE_STATION": np.array(POLICE_STATIONS, dtype=object)[station],
+        "PLACE": rng.choice(PLACES, size=rows, p=_zipf(len(PLACES))),
+        "Make": np.array(makes, dtype=object)[make],
+        "MAKE": model,
+        "Category": np.where(np.isin(model, list(SCOOTER_MODELS)), "Scooter", "Motorcycle"),
+        "Time_of_day": rng.choice(TIME_OF_DAY, size=rows, p=[0.2, 0.2, 0.25, 0.35]),
+        "DAY": dates.day_name().str.upper(),
+        "SPOT": rng.choice(SPOTS, size=rows, p=_zipf(len(SPOTS), 1.1)),
+        "LATITUDE": coords[:, 0].round(6),
+        "LONGITUDE": coords[:, 1].round(6),
+        "DATE": dates,
+        "STATUS": rng.choice(STATUSES, size=rows, p=[0.7, 0.3]),
+    })
+
+
+def iter_chunks(rows: int, seed: int):
+    if not 0 < rows <= MAX_ROWS:
+        raise ValueError(f"rows must be between 1 and {MAX_ROWS:,}")
+    for chunk_no, start in enumerate(range(0, rows, CHUNK_ROWS)):
+        yield generate_chunk(seed, chunk_no, min(CHUNK_ROWS, rows - start))
+
+
+def write_csv(path, rows: int, seed: int):
+    for chunk_no, frame in enumerate(iter_chunks(rows, seed)):
+        frame = frame.assign(DATE=frame["DATE"].dt.strftime("%Y-%m-%d"))
+        frame.to_csv(path, mode="w" if chunk_no == 0 else "a", header=chunk_no == 0, index=False)
+
+
+def load(db, rows: int, seed: int, batch_size: int = 10000, rollup: bool = True):
+    """Replace the thefts collection with the synthetic dataset."""
+    from indexes import THEFT_INDEXES
+
+    if db["meta"].find_one({"_id": BENCHMARK_META_ID}) is None and db["thefts"].find_one({}, {"_id": 1}):
+        raise RuntimeError(
+            f"Refusing to drop {db.name}.thefts: it holds data that was not loaded by the benchmarks. "
+            "Point BENCH_MONGO_DB at a dedicated database."
+        )
+    # Claim the database first, so an interrupted load can be redone.
+    db["meta"].replace_one({"_id": BENCHMARK_META_ID}, {"rows": None, "seed": None}, upsert=True)
+    db["thefts"].drop()
+    for frame in iter_chunks(rows, seed):
+        docs = to_documents(frame)
+        for start in range(0, len(docs), batch_size):
+            db["thefts"].insert_many(docs[start:start + batch_size], ordered=False)
+    db["thefts"].create_indexes(THEFT_INDEXES)
+    bump_dataset_version(db)
+    if rollup:
+        from rollup import rebuild
+        rebuild(db)
+    db["meta"].replace_one({"_id": BENCHMARK_META_ID}, {"rows": rows, "seed": seed}, upsert=True)
+
+
+def ensure_dataset(rows: int, seed: int, rollup: bool = True):
+    """Load the dataset unless the benchmark database already holds it."""
+    db = get_sync_database()
+    meta = db["meta"].find_one({"_id": BENCHMARK_META_ID}) or {}
+    if meta.get("rows") == rows and meta.get("seed") == seed and db["thefts"].estimated_document_count() == rows:
+        return False
+    started = time.perf_counter()
+    load(db, rows, seed, rollup=rollup)
+    print(f"Loaded {rows:,} synthetic rows (seed {seed}) in {time.perf_counter() - started:.1f}s")
+    return True
+
+
+def add_dataset_args(parser):
+    parser.add_argument("--rows", type=int, default=100_000, help=f"dataset size, up to {MAX_ROWS:,}")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_dataset_args(parser)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--csv", help="write a CSV for mongoscript.py")
+    target.add_argument("--load", action="store_true", help="insert into the benchmark database")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.csv:
+        write_csv(args.csv, args.rows, args.seed)
+        print(f"✅ Wrote {args.rows:,} rows to {args.csv} in {time.perf_counter() - started:.1f}s")
+    else:
+        load(get_sync_database(), args.rows, args.seed)
+        print(f"✅ Loaded {args.rows:,} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
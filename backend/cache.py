@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from mongodb import DATASET_VERSION_ID, get_meta_collection
+from singleflight import single_flight
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+CACHE_DEFAULT_TTL = float(os.getenv("CACHE_DEFAULT_TTL", "300"))
+# How often the dataset version document is re-read. Writers bump it, so this
+# is the worst-case delay before a reload shows up on the dashboard.
+VERSION_POLL_SECONDS = float(os.getenv("CACHE_VERSION_POLL_SECONDS", "5"))
+
+# Seconds a result may be served from memory, per route. Routes that are not
+# listed use CACHE_DEFAULT_TTL; a TTL of 0 disables caching for that route.
+ROUTE_TTLS = {
+    "total_thefts": 300,
+    "highest_police_station": 300,
+    "most_model": 300,
+    "peak_time": 300,
+    "thefts_by_ps": 300,
+    "time_slot_by_company": 300,
+    "thefts_company": 300,
+    "heatmap_grid": 300,
+    # Past trend buckets only change with the data, which bumps the version.
+    "theft_trends_closed": 3600,
+}
+
+
+class MemoryBackend:
+    """Bounded in-process LRU store with per-entry expiry.
+
+    Any object with the same get/set/clear/__len__ interface can be passed to
+    ResultCache, e.g. a Redis-backed store shared between workers.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """Return (found, value)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def canonical_key(route: str, query: dict, extra: Any = None) -> str:
+    """Stable key for a route and a build_filter_query result.
+
+    $in lists are sorted so "A,B" and "B,A" share an entry. Every other list
+    keeps its order: it can be meaningful, e.g. a GeoJSON polygon's
+    [lon, lat] pairs. extra is used as given.
+    """
+    def normalize(value, unordered=False):
+        if isinstance(value, dict):
+            return {k: normalize(v, k == "$in") for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            items = [normalize(v) for v in value]
+            if unordered:
+                items.sort(key=lambda v: json.dumps(v, sort_keys=True, default=str))
+            return items
+        return value
+
+    return json.dumps(
+        [route, normalize(query), extra],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+
+
+class ResultCache:
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._version_checked_at = 0.0
+        self._lock = threading.Lock()
+
+    async def dataset_version(self):
+        """Current dataset version, re-read from Mongo at most every VERSION_POLL_SECONDS."""
+        now = time.monotonic()
+        if now - self._version_checked_at < VERSION_POLL_SECONDS:
+            return self._version
+
+        doc = await get_meta_collection().find_one({"_id": DATASET_VERSION_ID}) or {}
+        version = doc.get("version", 0)
+        with self._lock:
+            if version != self._version:
+                # Old entries can never be hit again, free them right away.
+                self.backend.clear()
+                self._version = version
+            self._version_checked_at = now
+        return version
+
+    async def get_or_compute(self, route: str, query: dict, compute: Callable[[], Awaitable[Any]], extra: Any = None):
+        ttl = ROUTE_TTLS.get(route, CACHE_DEFAULT_TTL)
+        if ttl <= 0:
+            return await compute()
+
+        key = canonical_key(route, query, extra)
+        version = await self.dataset_version()
+        found, value = self.backend.get(key)
+        if found and value[0] == version:
+            self.hits += 1
+            return value[1]
+
+        self.misses += 1
+
+        async def compute_and_store():
+            value = await compute()
+            self.backend.set(key, (version, value), ttl)
+            return value
+
+        # Concurrent misses on the same key share one computation.
+        return await single_flight.do(route, f"{version}:{key}", compute_and_store)
+
+    async def lookup(self, route: str, query: dict, extra: Any = None):
+        """Return (found, value) without computing on a miss."""
+        key = canonical_key(route, query, extra)
+        version = await self.dataset_version()
+        found, value = self.backend.get(key)
+        if found and value[0] == version:
+            self.hits += 1
+            return True, value[1]
+        self.misses += 1
+        return False, None
+
+    def store(self, route: str, query: dict, value: Any, version, extra: Any = None):
+        """Cache value as computed from data at version, the dataset_version()
+        read before the computation started."""
+        ttl = ROUTE_TTLS.get(route, CACHE_DEFAULT_TTL)
+        if ttl <= 0 or version != self._version:
+            # A reload landed meanwhile; the entry could never be hit anyway.
+            return
+        key = canonical_key(route, query, extra)
+        self.backend.set(key, (version, value), ttl)
+
+    def invalidate(self):
+        self.backend.clear()
+        self._version_checked_at = 0.0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": getattr(self.backend, "evictions", None),
+            "expirations": getattr(self.backend, "expirations", None),
+            "entries": len(self.backend),
+            "max_entries": getattr(self.backend, "max_entries", None),
+            "dataset_version": self._version,
+        }
+
+
+result_cache = ResultCache()
+
+
+def set_cache_backend(backend):
+    """Swap the storage used by the shared result cache."""
+    result_cache.backend = backend
+    result_cache.invalidate()
@@ -0,0 +1,102 @@
+"""Vectorized cleaning rules shared by the ingest, repair and live-ingest paths.
+
+Each helper works on a whole pandas Series at once. The rules match the old
+per-record clean_coord in pythonscripts.py: keep digits, "." and "-", then
+parse as float.
+"""
+import pandas as pd
+
+from geo import LOCATION_FIELD, location_point
+
+COORD_JUNK = r"[^0-9.\-]"
+TEXT_FIELDS = ("Make", "MAKE")
+# Coordinate problems only null LATITUDE/LONGITUDE: such a theft still counts
+# everywhere except the map, so the row is kept and reported unless the
+# caller opts in to rejecting it (see rejected_rows).
+COORD_PROBLEMS = r"(?:invalid|missing)_coordinates;?"
+
+
+def clean_coords(series: pd.Series) -> pd.Series:
+    """Strip everything but digits, "." and "-" and parse as float (NaN if invalid)."""
+    cleaned = series.astype("string").str.replace(COORD_JUNK, "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce").astype("float64")
+
+
+def parse_dates(series: pd.Series, dayfirst: bool = False, date_format=None) -> pd.Series:
+    """Parse DATE text into datetimes (NaT if invalid).
+
+    Values that are already datetimes pass through unchanged.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, errors="coerce", dayfirst=dayfirst, format=date_format)
+
+
+def normalize_text(series: pd.Series) -> pd.Series:
+    """Trim and collapse inner whitespace; missing values stay missing.
+
+    Case is kept: filters such as company=Honda match the stored value exactly.
+    """
+    text = series.astype("string").str.strip().str.replace(r"\s+", " ", regex=True)
+    return text.mask(text == "")
+
+
+def clean_frame(df: pd.DataFrame, dayfirst: bool = False, date_format=None):
+    """Type and validate a chunk of theft rows.
+
+    Returns (df, reasons): df has float LATITUDE/LONGITUDE, datetime DATE and
+    normalized Make/MAKE; reasons is a Series of the problems found ("" for
+    valid rows) aligned with df's index. Which of them reject the row is up
+    to rejected_rows.
+    """
+    df = df.copy()
+    reasons = pd.Series("", index=df.index, dtype="object")
+
+    def reject(mask, reason):
+        reasons.loc[mask] = reasons.loc[mask] + reason + ";"
+
+    if "LATITUDE" in df.columns and "LONGITUDE" in df.columns:
+        df["LATITUDE"] = clean_coords(df["LATITUDE"])
+        df["LONGITUDE"] = clean_coords(df["LONGITUDE"])
+        bad_coords = (
+            df["LATITUDE"].isna() | df["LONGITUDE"].isna()
+            | ~df["LATITUDE"].between(-90, 90) | ~df["LONGITUDE"].between(-180, 180)
+        )
+        reject(bad_coords, "invalid_coordinates")
+        df.loc[bad_coords, ["LATITUDE", "LONGITUDE"]] = float("nan")
+    else:
+        reject(pd.Series(True, index=df.index), "missing_coordinates")
+
+    if "DATE" in df.columns:
+        df["DATE"] = parse_dates(df["DATE"], dayfirst=dayfirst, date_format=date_format)
+        reject(df["DATE"].isna(), "invalid_date")
+    else:
+        reject(pd.Series(True, index=df.index), "missing_date")
+
+    for field in TEXT_FIELDS:
+        if field in df.columns:
+            df[field] = normalize_text(df[field])
+
+    return df, reasons.str.rstrip(";")
+
+
+def rejected_rows(reasons: pd.Series, reject_bad_coords: bool = False) -> pd.Series:
+    """Rows to leave out: any problem other than the coordinates, and
+    coordinate problems too when reject_bad_coords is set."""
+    if reject_bad_coords:
+        return reasons != ""
+    return reasons.str.replace(COORD_PROBLEMS, "", regex=True) != ""
+
+
+def to_documents(df: pd.DataFrame):
+    """DataFrame rows as Mongo documents, with NaN/NaT/<NA> stored as null.
+    Rows with coordinates also get the GeoJSON location point."""
+    records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+    for record in records:
+        date = record.get("DATE")
+        if isinstance(date, pd.Timestamp):
+            record["DATE"] = date.to_pydatetime()
+        lat, lon = record.get("LATITUDE"), record.get("LONGITUDE")
+        if isinstance(lat, float) and isinstance(lon, float):
+            record[LOCATION_FIELD] = location_point(lat, lon)
+    return records
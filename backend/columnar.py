@@ -0,0 +1,230 @@
+"""In-process columnar snapshot of the thefts collection.
+
+Enabled with ANALYTICS_ENGINE=columnar. The collection is loaded once per
+dataset version into NumPy arrays: one int32 code array per filter
+dimension (with the distinct values kept alongside) and float arrays for the
+coordinates, plus a datetime64 array for DATE. Filters from
+build_filter_query become boolean masks and group counts come from
+np.bincount, so dashboard widgets and the heatmap grid are answered without
+a Mongo round trip.
+
+The snapshot is replaced as a whole when the dataset version changes. Until
+the new one is loaded, and for any query it cannot evaluate, callers get
+None and fall back to Mongo.
+"""
+import asyncio
+import logging
+import math
+import operator
+import os
+import time
+from datetime import datetime
+
+from cache import result_cache
+from mongodb import get_thefts_collection
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("ANALYTICS_ENGINE", "mongo") == "columnar"
+if ENABLED:
+    # Only the snapshot needs numpy; without it the app starts without paying
+    # for the import.
+    import numpy as np
+
+DIMENSIONS = ("POLICE_STATION", "PLACE", "Make", "MAKE", "Category", "Time_of_day", "DAY", "SPOT")
+LOAD_BATCH_SIZE = 10000
+RANGE_OPS = {"$gte": operator.ge, "$gt": operator.gt, "$lte": operator.le, "$lt": operator.lt}
+
+
+def _to_float(value):
+    # Mirrors {"$convert": {"to": "double", "onError": None}} closely enough
+    # for coordinates: numbers and numeric strings, anything else is NaN.
+    if isinstance(value, bool):
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _dimension_value(value):
+    # Documents loaded by the old insert_many hold NaN for empty cells; each
+    # NaN would otherwise become a category of its own.
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+# MongoDB's comparison order across the types a dimension can hold.
+BSON_TYPE_ORDER = ((type(None), 0), (bool, 8), (int, 1), (float, 1), (str, 2), (datetime, 9))
+
+
+def _bson_key(value):
+    """Sort key ordering mixed-type values as Mongo's $sort does."""
+    rank = next((rank for kind, rank in BSON_TYPE_ORDER if isinstance(value, kind)), 3)
+    return (rank, value if rank in (1, 2, 8, 9) else str(value))
+
+
+class Snapshot:
+    def __init__(self, version, docs):
+        self.version = version
+        self.size = len(docs)
+        self.codes = {}
+        self.values = {}
+        for dim in DIMENSIONS:
+            index = {}
+            self.codes[dim] = np.fromiter(
+                (index.setdefault(_dimension_value(doc.get(dim)), len(index)) for doc in docs),
+                dtype=np.int32, count=self.size
+            )
+            self.values[dim] = list(index)
+        self.lat = np.fromiter((_to_float(doc.get("LATITUDE")) for doc in docs), dtype=np.float64, count=self.size)
+        self.lon = np.fromiter((_to_float(doc.get("LONGITUDE")) for doc in docs), dtype=np.float64, count=self.size)
+        # Text dates are NaT, so like in Mongo no date range matches them.
+        self.dates = np.array(
+            [d if isinstance(d, datetime) else None for d in (doc.get("DATE") for doc in docs)],
+            dtype="datetime64[ms]"
+        )
+
+    def _equals(self, dim, wanted):
+        lookup = {v: i for i, v in enumerate(self.values[dim])}
+        codes = [lookup[v] for v in wanted if v in lookup]
+        return np.isin(self.codes[dim], codes)
+
+    def mask(self, query: dict):
+        """Boolean row mask for a build_filter_query result, or None when the
+        query uses something this engine does not evaluate."""
+        mask = np.ones(self.size, dtype=bool)
+        for field, cond in query.items():
+            if field == "DATE":
+                if not isinstance(cond, dict) or not set(cond) <= set(RANGE_OPS):
+                    return None
+                for op, bound in cond.items():
+                    mask &= RANGE_OPS[op](self.dates, np.datetime64(bound, "ms"))
+                continue
+            if field not in self.codes:
+                return None
+            if isinstance(cond, dict):
+                if set(cond) != {"$in"}:
+                    return None
+                mask &= self._equals(field, cond["$in"])
+            else:
+                mask &= self._equals(field, [cond])
+        return mask
+
+    def counts(self, dim, mask):
+        """[(value, count)] for every value of dim present under mask."""
+        counts = np.bincount(self.codes[dim][mask], minlength=len(self.values[dim]))
+        return [(self.values[dim][i], int(counts[i])) for i in np.flatnonzero(counts)]
+
+    def pair_counts(self, first, second, mask):
+        width = len(self.values[second])
+        combined = self.codes[first][mask].astype(np.int64) * width + self.codes[second][mask]
+        counts = np.bincount(combined, minlength=len(self.values[first]) * width)
+        return [
+            ((self.values[first][i // width], self.values[second][i % width]), int(counts[i]))
+            for i in np.flatnonzero(counts)
+        ]
+
+    def heatmap_rows(self, mask, cell):
+        lat, lon = self.lat[mask], self.lon[mask]
+        valid = (lat >= -90) & (lat <= 90) & (lon >= -180) & (lon <= 180)
+        bins = np.stack([np.floor(lat[valid] / cell), np.floor(lon[valid] / cell)], axis=1)
+        if not len(bins):
+            return []
+        cells, weights = np.unique(bins, axis=0, return_counts=True)
+        centres = cells * cell + cell / 2
+        return [
+            {"_id": {"lat": float(la), "lon": float(lo)}, "weight": int(w)}
+            for (la, lo), w in zip(centres, weights)
+        ]
+
+
+def _top(pairs, limit=None):
+    rows = [{"_id": v, "count": c} for v, c in sorted(pairs, key=lambda p: -p[1])]
+    return rows[:limit] if limit else rows
+
+
+def _thefts_by_ps(snap, mask):
+    merged = {}
+    for value, count in snap.counts("POLICE_STATION", mask):
+        key = "Unknown" if value is None else value
+        merged[key] = merged.get(key, 0) + count
+    return _top(merged.items())
+
+
+# Same rows the FACETS pipelines in analytics.py return, so the shapers apply
+# unchanged.
+FACET_ROWS = {
+    "total_thefts": lambda snap, mask: [{"count": int(mask.sum())}] if mask.any() else [],
+    "highest_police_station": lambda snap, mask: _top(snap.counts("POLICE_STATION", mask), 1),
+    "most_model": lambda snap, mask: _top(snap.counts("MAKE", mask), 5),
+    "peak_time": lambda snap, mask: _top(snap.counts("Time_of_day", mask), 1),
+    "thefts_by_ps": _thefts_by_ps,
+    "time_slot_by_company": lambda snap, mask: [
+        {"_id": {"company": company, "Time_slot": slot}, "count": count}
+        for (company, slot), count in sorted(
+            snap.pair_counts("MAKE", "Time_of_day", mask), key=lambda p: _bson_key(p[0][0])
+        )
+    ],
+    "thefts_company": lambda snap, mask: [
+        {"_id": v, "count": c} for v, c in sorted(snap.counts("Make", mask), key=lambda p: _bson_key(p[0]))
+    ],
+}
+
+
+class ColumnarEngine:
+    def __init__(self):
+        self._snapshot = None
+        self._loading = None
+
+    async def _load(self, version):
+        started = time.perf_counter()
+        projection = {"_id": 0, **{dim: 1 for dim in DIMENSIONS}, "LATITUDE": 1, "LONGITUDE": 1, "DATE": 1}
+        cursor = get_thefts_collection().find({}, projection, batch_size=LOAD_BATCH_SIZE)
+        docs = await cursor.to_list()
+        snapshot = await asyncio.to_thread(Snapshot, version, docs)
+        # Readers keep whichever snapshot they already picked up.
+        self._snapshot = snapshot
+        logger.info("Columnar snapshot v%s: %d rows in %.2fs", version, snapshot.size, time.perf_counter() - started)
+
+    def _done(self, task):
+        self._loading = None
+        if not task.cancelled() and task.exception():
+            logger.error("Columnar snapshot load failed: %s", task.exception())
+
+    def refresh(self, version):
+        if self._loading is None:
+            self._loading = asyncio.create_task(self._load(version))
+            self._loading.add_done_callback(self._done)
+        return self._loading
+
+    async def current(self):
+        """The snapshot for the current dataset version, or None while it is
+        (re)loading in the background."""
+        if not ENABLED:
+            return None
+        version = await result_cache.dataset_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        self.refresh(version)
+        return None
+
+    def facet_rows(self, snapshot, query, names):
+        mask = snapshot.mask(query)
+        if mask is None:
+            return None
+        return {name: FACET_ROWS[name](snapshot, mask) for name in names}
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "enabled": ENABLED,
+            "loading": self._loading is not None,
+            "version": snapshot.version if snapshot else None,
+            "rows": snapshot.size if snapshot else 0,
+        }
+
+
+columnar_engine = ColumnarEngine()
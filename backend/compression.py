@@ -0,0 +1,172 @@
+"""Response compression negotiated from Accept-Encoding.
+
+Brotli is preferred when the optional brotli package is installed and the
+client accepts it, otherwise gzip. Bodies smaller than COMPRESSION_MIN_SIZE
+and already-compressed types are sent as they are. Streamed responses
+(NDJSON/CSV exports) are compressed chunk by chunk and flushed after every
+chunk, so clients still see rows as they are produced. A compressed
+response's ETag is sent weak (W/"..."), as its bytes are not the ones the
+ETag was computed from.
+"""
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is used without it
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Formats that are already compressed gain nothing from another pass.
+SKIP_TYPES = ("application/pdf", "image/", "application/zip", "application/gzip")
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def accepted_encodings(header: str):
+    """{coding: q} from an Accept-Encoding header value."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoder(header: str):
+    accepted = accepted_encodings(header)
+
+    def ok(coding):
+        return accepted.get(coding, accepted.get("*", 0)) > 0
+
+    if brotli is not None and ok("br"):
+        return BrotliEncoder
+    if ok("gzip"):
+        return GzipEncoder
+    return None
+
+
+def _weak_etag(value: bytes) -> bytes:
+    # The encoded bytes differ from the ones the strong validator names.
+    return value if value.startswith(b"W/") else b"W/" + value
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoder_cls = choose_encoder(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoder_cls is None:
+            await self.app(scope, receive, send)
+            return
+        await _Responder(send, encoder_cls, self.minimum_size).run(self.app, scope, receive)
+
+
+class _Responder:
+    def __init__(self, send, encoder_cls, minimum_size):
+        self.send = send
+        self.encoder_cls = encoder_cls
+        self.minimum_size = minimum_size
+        self.start = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def run(self, app, scope, receive):
+        await app(scope, receive, self.handle)
+
+    async def handle(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk shows whether to compress.
+            self.start = message
+            response_headers = {k.lower(): v for k, v in message.get("headers", [])}
+            content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+            self.passthrough = (
+                b"content-encoding" in response_headers
+                or content_type.startswith(SKIP_TYPES)
+            )
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start is not None:
+            start, self.start = self.start, None
+            if self.passthrough or (not more_body and len(body) < self.minimum_size):
+                if not self.passthrough:
+                    # Larger bodies of this type are compressed.
+                    start = {**start, "headers": [*start.get("headers", []), (b"vary", b"Accept-Encoding")]}
+                await self.send(start)
+                await self.send(message)
+                self.passthrough = True
+                return
+
+            self.encoder = self.encoder_cls()
+            headers = [(k, _weak_etag(v) if k.lower() == b"etag" else v)
+                       for k, v in start.get("headers", []) if k.lower() != b"content-length"]
+            headers.append((b"content-encoding", self.encoder.name.encode()))
+            headers.append((b"vary", b"Accept-Encoding"))
+            if not more_body:
+                compressed = self.encoder.compress(body) + self.encoder.finish()
+                headers.append((b"content-length", str(len(compressed)).encode()))
+                await self.send({**start, "headers": headers})
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            await self.send({**start, "headers": headers})
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        chunk = self.encoder.compress(body)
+        chunk += self.encoder.flush() if more_body else self.encoder.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,24 @@
+"""GeoJSON location field and the viewport/radius conditions on it.
+
+Each document with valid coordinates carries location: {"type": "Point",
+"coordinates": [lon, lat]}, indexed 2dsphere (see indexes.py). It is written
+by the ingest (cleaning.to_documents) and backfilled by repair_coords.py;
+documents without usable coordinates have no location and never match.
+"""
+LOCATION_FIELD = "location"
+
+
+def location_point(lat, lon):
+    return {"type": "Point", "coordinates": [float(lon), float(lat)]}
+
+
+def bbox_condition(min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+    """$geoWithin a map viewport. Edges are geodesic, which differs from the
+    drawn rectangle by well under a pixel at city zoom levels."""
+    ring = [[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]]
+    return {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}
+
+
+def near_condition(lat: float, lon: float, radius_m: float):
+    """$nearSphere a point, nearest first, out to radius_m metres."""
+    return {"$nearSphere": {"$geometry": location_point(lat, lon), "$maxDistance": radius_m}}
@@ -0,0 +1,141 @@
+import hashlib
+import itertools
+import os
+from pathlib import Path
+
+from cache import MemoryBackend, canonical_key
+from columnar import columnar_engine
+from mongodb import MAX_TIME_MS, get_thefts_collection
+
+# Grid cell size in degrees. 0.005° is ~550 m, about 4 px at the page's
+# zoom_start and inside the 8 px HeatMap radius, so binning does not change
+# the picture; the cell count stays bounded by the area rather than growing
+# with the thefts (~16k cells for 100k synthetic thefts, against ~91k at
+# 0.0005°). Clients zoomed further in can ask for a smaller cell.
+DEFAULT_CELL = 0.005
+
+MAP_CENTER = [16.5777, 74.3155]
+
+# Rendered pages are cached by ETag, which already encodes the filters, cell
+# size and dataset version, so entries never need explicit invalidation.
+HEATMAP_MAX_AGE = int(os.getenv("HEATMAP_MAX_AGE", "60"))
+HEATMAP_PAGE_CACHE_ENTRIES = int(os.getenv("HEATMAP_PAGE_CACHE_ENTRIES", "64"))
+# Optional directory for rendered pages, so a restarted worker comes up warm.
+HEATMAP_CACHE_DIR = os.getenv("HEATMAP_CACHE_DIR")
+HEATMAP_DISK_MAX_FILES = int(os.getenv("HEATMAP_DISK_MAX_FILES", "512"))
+
+# Pages are keyed by ETag, so a long in-memory lifetime is safe; the LRU bound
+# is what keeps memory in check.
+HEATMAP_MAX_AGE_IN_MEMORY = 24 * 3600
+page_cache = MemoryBackend(max_entries=HEATMAP_PAGE_CACHE_ENTRIES)
+
+
+def heatmap_pipeline(query: dict, cell: float = DEFAULT_CELL):
+    """Count thefts per grid cell, keyed on the cell centre.
+
+    Coordinates are converted server-side, so string values left over from
+    the CSV load still count and anything non-numeric or out of range is
+    dropped, as the old per-point loop did.
+    """
+    def to_double(field):
+        return {"$convert": {"input": f"${field}", "to": "double", "onError": None, "onNull": None}}
+
+    def bin_centre(field):
+        return {"$add": [{"$multiply": [{"$floor": {"$divide": [f"${field}", cell]}}, cell]}, cell / 2]}
+
+    return [
+        {"$match": query},
+        {"$project": {"_id": 0, "lat": to_double("LATITUDE"), "lon": to_double("LONGITUDE")}},
+        {"$match": {"lat": {"$gte": -90, "$lte": 90}, "lon": {"$gte": -180, "$lte": 180}}},
+        {"$group": {
+            "_id": {"lat": bin_centre("lat"), "lon": bin_centre("lon")},
+            "weight": {"$sum": 1}
+        }},
+    ]
+
+
+async def heatmap_grid(query: dict, cell: float = DEFAULT_CELL):
+    """Weighted grid: {"points": [[lat, lon, weight], ...], "max_weight", "total", "cell"}."""
+    snapshot = await columnar_engine.current()
+    mask = snapshot.mask(query) if snapshot else None
+    if mask is not None:
+        rows = snapshot.heatmap_rows(mask, cell)
+    else:
+        cursor = await get_thefts_collection().aggregate(heatmap_pipeline(query, cell), maxTimeMS=MAX_TIME_MS)
+        rows = await cursor.to_list()
+
+    points = [[round(r["_id"]["lat"], 6), round(r["_id"]["lon"], 6), r["weight"]] for r in rows]
+    return {
+        "points": points,
+        "max_weight": max((p[2] for p in points), default=0),
+        "total": sum(p[2] for p in points),
+        "cell": cell,
+    }
+
+
+def _assign_stable_ids(element, counter):
+    # Folium names elements with random uuids; numbering them in tree order
+    # makes identical inputs render to identical bytes, as a strong ETag needs.
+    element._id = format(next(counter), "032x")
+    for child in element._children.values():
+        _assign_stable_ids(child, counter)
+
+
+def render_heatmap(points):
+    # folium (and the pandas it pulls in) costs more to import than the rest
+    # of the app, so it is only loaded once a page actually has to be rendered.
+    import folium
+    from folium.plugins import HeatMap
+
+    m = folium.Map(location=MAP_CENTER, zoom_start=9.3, tiles="OpenStreetMap")
+
+    if points:
+        HeatMap(points, radius=8, blur=6, min_opacity=0.7).add_to(m)
+
+    root = m.get_root()
+    _assign_stable_ids(root, itertools.count())
+    return root.render()
+
+
+def page_etag(query: dict, cell: float, version) -> str:
+    """Strong ETag for the rendered page of a filter set at a dataset version."""
+    key = canonical_key("thefts_heatmap", query, [cell, version])
+    return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    # Weak comparison is the rule for If-None-Match.
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _page_path(etag: str) -> Path:
+    return Path(HEATMAP_CACHE_DIR) / (etag.strip('"') + ".html")
+
+
+def load_page_from_disk(etag: str):
+    if not HEATMAP_CACHE_DIR:
+        return None
+    try:
+        html = _page_path(etag).read_text(encoding="utf-8")
+    except OSError:
+        return None
+    page_cache.set(etag, html, HEATMAP_MAX_AGE_IN_MEMORY)
+    return html
+
+
+def save_page_to_disk(etag: str, html: str):
+    if not HEATMAP_CACHE_DIR:
+        return
+    directory = Path(HEATMAP_CACHE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = _page_path(etag)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(html, encoding="utf-8")
+    os.replace(tmp, path)
+
+    files = sorted(directory.glob("*.html"), key=lambda p: p.stat().st_mtime)
+    for old in files[:-HEATMAP_DISK_MAX_FILES]:
+        old.unlink(missing_ok=True)
@@ -0,0 +1,69 @@
+import logging
+
+from pymongo import ASCENDING, GEOSPHERE, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from geo import LOCATION_FIELD
+from mongodb import get_thefts_collection
+
+logger = logging.getLogger(__name__)
+
+# Every field build_filter_query can match on gets its own index so any single
+# filter is an IXSCAN. The compound indexes cover the combinations the
+# dashboard sends together most often (station drill-down, company + time
+# slot); their leading field also serves the single-field case. DATE comes
+# last in the date-bearing compounds so an equality prefix plus a date_from/
+# date_to range is a single bounded index scan.
+THEFT_INDEXES = [
+    IndexModel([("POLICE_STATION", ASCENDING), ("Time_of_day", ASCENDING)], name="station_time_of_day"),
+    IndexModel([("Make", ASCENDING), ("Time_of_day", ASCENDING)], name="make_time_of_day"),
+    # Report date ranges, optionally per station.
+    IndexModel([("POLICE_STATION", ASCENDING), ("DATE", ASCENDING)], name="station_date"),
+    IndexModel([("POLICE_STATION", ASCENDING), ("Make", ASCENDING), ("DATE", ASCENDING)], name="station_make_date"),
+    IndexModel([("Make", ASCENDING), ("DATE", ASCENDING)], name="make_date"),
+    IndexModel([("PLACE", ASCENDING), ("DATE", ASCENDING)], name="place_date"),
+    IndexModel([("DATE", ASCENDING)], name="date"),
+    IndexModel([("Category", ASCENDING)], name="category"),
+    IndexModel([("Time_of_day", ASCENDING)], name="time_of_day"),
+    IndexModel([("DAY", ASCENDING)], name="day"),
+    IndexModel([("SPOT", ASCENDING)], name="spot"),
+    # Map viewport and radius queries.
+    IndexModel([(LOCATION_FIELD, GEOSPHERE)], name="location_2dsphere"),
+    # Case lookup and CaseNo prefix search. Partial so rows without a case
+    # number don't collide on null; queries repeat the $type to match it.
+    IndexModel(
+        [("CaseNo", ASCENDING)], name="case_no_unique", unique=True,
+        partialFilterExpression={"CaseNo": {"$type": "string"}}
+    ),
+    # Word search over place, make/model and station. Names, not prose, so
+    # no stemming or stop words.
+    IndexModel(
+        [("PLACE", TEXT), ("Make", TEXT), ("MAKE", TEXT), ("POLICE_STATION", TEXT)],
+        name="case_search_text", default_language="none"
+    ),
+]
+
+
+async def ensure_indexes(collection=None, indexes=THEFT_INDEXES):
+    """Create the declared indexes; indexes that already exist are left alone.
+
+    A conflicting definition (same name, different keys or options) is logged
+    and skipped rather than failing startup.
+    """
+    collection = collection if collection is not None else get_thefts_collection()
+    ready = []
+    for index in indexes:
+        name = index.document["name"]
+        try:
+            await collection.create_indexes([index])
+            ready.append(name)
+        except OperationFailure as e:
+            logger.warning("Could not create index %s on %s: %s", name, collection.name, e)
+    return ready
+
+
+async def missing_indexes(collection=None, indexes=THEFT_INDEXES):
+    """Names of declared indexes that are not present on the collection."""
+    collection = collection if collection is not None else get_thefts_collection()
+    existing = set(await collection.index_information())
+    return [index.document["name"] for index in indexes if index.document["name"] not in existing]
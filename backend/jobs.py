@@ -0,0 +1,256 @@
+"""Background jobs for reports and PDFs.
+
+A submitted job runs as an asyncio task: Mongo reads on the event loop, PDF
+rendering in the shared process pool (see workers.py). Clients poll the job
+for status and progress and fetch the artifact once it is done, so a large
+report or case list never holds a request open. At most JOB_MAX_RUNNING jobs
+run at once per worker; the rest stay queued, and a submission finding
+JOB_MAX_PENDING jobs already queued is refused (JobQueueFull, a 503).
+
+Artifacts are kept in memory in a store bounded by total bytes, oldest
+evicted first, and expire after JOB_RESULT_TTL seconds; a job is forgotten
+with its artifact. Submitting the same kind and parameters while an earlier
+job is running or its artifact is still held returns that job rather than
+starting another. Jobs live in the worker process that accepted them, so
+with several uvicorn workers clients need sticky sessions.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+from cache import canonical_key, result_cache
+from mongodb import MAX_TIME_MS, get_thefts_collection
+from pdf_export import COLUMNS, render_cases_pdf
+from report import ReportError, generate_summary
+from responses import dumps, theft_record
+from workers import run_in_process
+
+logger = logging.getLogger(__name__)
+
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "900"))
+JOB_STORE_MAX_BYTES = int(os.getenv("JOB_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Upper bound on the cases a filter-based PDF job reads.
+PDF_JOB_MAX_CASES = int(os.getenv("PDF_JOB_MAX_CASES", "50000"))
+PDF_FETCH_BATCH = 1000
+# Jobs running at once, and jobs waiting for a slot, per worker.
+JOB_MAX_RUNNING = int(os.getenv("JOB_MAX_RUNNING", "2"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "20"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Artifact:
+    def __init__(self, content: bytes, media_type: str, filename: str = None):
+        self.content = content
+        self.media_type = media_type
+        self.filename = filename
+
+
+class ArtifactStore:
+    """Artifacts bounded by their total size, each expiring after ttl seconds."""
+
+    def __init__(self, max_bytes: int = JOB_STORE_MAX_BYTES, ttl: float = JOB_RESULT_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+
+    def _drop(self, job_id):
+        _, artifact = self._entries.pop(job_id)
+        self.size -= len(artifact.content)
+
+    def _expire(self):
+        now = time.monotonic()
+        # Entries are in insertion order and share one ttl, so the expired
+        # ones are at the front.
+        while self._entries and next(iter(self._entries.values()))[0] <= now:
+            self._drop(next(iter(self._entries)))
+            self.expirations += 1
+
+    def put(self, job_id: str, artifact: Artifact) -> bool:
+        """Store an artifact, evicting the oldest as needed; False if it is
+        larger than the whole store."""
+        if len(artifact.content) > self.max_bytes:
+            return False
+        self._expire()
+        self._entries[job_id] = (time.monotonic() + self.ttl, artifact)
+        self.size += len(artifact.content)
+        while self.size > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+        return True
+
+    def get(self, job_id: str):
+        self._expire()
+        entry = self._entries.get(job_id)
+        return entry[1] if entry else None
+
+    def __contains__(self, job_id):
+        self._expire()
+        return job_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Job:
+    def __init__(self, kind: str, key: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = QUEUED
+        self.progress = 0.0
+        self.error = None
+        self.status_code = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.task = None
+
+    def view(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    def __init__(self, store: ArtifactStore = None, max_running: int = JOB_MAX_RUNNING,
+                 max_pending: int = JOB_MAX_PENDING):
+        self.store = store or ArtifactStore()
+        self.max_running = max_running
+        self.max_pending = max_pending
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(max_running)
+        self._jobs = OrderedDict()
+        self._by_key = {}
+
+    def _prune(self):
+        now = time.time()
+        for job in list(self._jobs.values()):
+            expired = (
+                (job.status == DONE and job.id not in self.store)
+                or (job.status == FAILED and now - job.finished_at > self.store.ttl)
+            )
+            if expired:
+                del self._jobs[job.id]
+                if self._by_key.get(job.key) is job:
+                    del self._by_key[job.key]
+
+    async def submit(self, kind: str, params: dict, run):
+        """Queue run(job) -> Artifact unless an identical job is queued,
+        running or done; returns (job, deduplicated). Raises JobQueueFull
+        when max_pending jobs are already waiting."""
+        self._prune()
+        # A reload changes the answer, so it also ends deduplication.
+        key = canonical_key(f"job:{kind}", params, await result_cache.dataset_version())
+        existing = self._by_key.get(key)
+        if existing is not None and existing.status != FAILED:
+            self.deduplicated += 1
+            return existing, True
+        states = [job.status for job in self._jobs.values()]
+        # Queued jobs with a free slot are only waiting for their task to start.
+        waiting = states.count(QUEUED) - max(0, self.max_running - states.count(RUNNING))
+        if waiting >= self.max_pending:
+            self.rejected += 1
+            raise JobQueueFull("Too many jobs queued, retry shortly")
+
+        job = Job(kind, key)
+        self._jobs[job.id] = job
+        self._by_key[key] = job
+        self.submitted += 1
+        job.task = asyncio.create_task(self._run(job, run))
+        return job, False
+
+    async def _run(self, job: Job, run):
+        async with self._slots:
+            job.status = RUNNING
+            try:
+                artifact = await run(job)
+                if self.store.put(job.id, artifact):
+                    job.status, job.progress = DONE, 1.0
+                else:
+                    job.status, job.status_code = FAILED, 507
+                    job.error = "Result is larger than the job store allows"
+            except ReportError as e:
+                job.status, job.error, job.status_code = FAILED, e.message, e.status_code
+            except Exception as e:
+                logger.exception("Job %s (%s) failed", job.id, job.kind)
+                job.status, job.error, job.status_code = FAILED, str(e), 500
+            finally:
+                job.finished_at = time.time()
+
+    def get(self, job_id: str):
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def result(self, job_id: str):
+        return self.store.get(job_id)
+
+    def stats(self):
+        self._prune()
+        states = [job.status for job in self._jobs.values()]
+        return {
+            "jobs": {state: states.count(state) for state in (QUEUED, RUNNING, DONE, FAILED)},
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "rejected": self.rejected,
+            "max_running": self.max_running,
+            "max_pending": self.max_pending,
+            "artifacts": len(self.store),
+            "artifact_bytes": self.store.size,
+            "max_bytes": self.store.max_bytes,
+            "evictions": self.store.evictions,
+            "expirations": self.store.expirations,
+        }
+
+
+job_manager = JobManager()
+
+
+def cases_digest(cases: list) -> str:
+    """Dedup key for an uploaded case list; row order matters to the PDF."""
+    return hashlib.sha256(dumps(cases)).hexdigest()
+
+
+async def run_report(job: Job, police_station=None, start_date=None, end_date=None):
+    summary = await generate_summary(police_station, start_date, end_date)
+    return Artifact(dumps(summary), "application/json")
+
+
+async def _fetch_cases(job: Job, query: dict):
+    collection = get_thefts_collection()
+    total = await collection.count_documents(query, limit=PDF_JOB_MAX_CASES, maxTimeMS=MAX_TIME_MS)
+    projection = {"_id": 0, **{field: 1 for field, _, _ in COLUMNS}}
+    cursor = collection.find(query, projection, batch_size=PDF_FETCH_BATCH, max_time_ms=MAX_TIME_MS)
+    cases = []
+    async for case in cursor.limit(PDF_JOB_MAX_CASES):
+        cases.append(theft_record(case))
+        if len(cases) % PDF_FETCH_BATCH == 0:
+            # Reading is the first half of the job, rendering the second.
+            job.progress = 0.5 * len(cases) / total
+    return cases
+
+
+async def run_pdf(job: Job, cases: list = None, query: dict = None):
+    if cases is None:
+        cases = await _fetch_cases(job, query)
+    job.progress = 0.5
+    pdf_bytes = await run_in_process(render_cases_pdf, cases)
+    return Artifact(pdf_bytes, "application/pdf", "filtered_reports.pdf")
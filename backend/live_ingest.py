@@ -0,0 +1,232 @@
+"""Add or correct thefts in batches, keeping derived data current.
+
+Usage (from backend/):
+    python live_ingest.py path/to/records.(csv|json|ndjson) [--batch-size 1000]
+        [--dayfirst] [--date-format FMT] [--reject-bad-coords] [--keep-invalid]
+
+Also served as POST /api/thefts/batch. Records are cleaned with the same
+rules as the CSV ingest (cleaning.py), then upserted on CaseNo, so sending a
+record again replaces it instead of duplicating it. Records without a CaseNo
+are rejected; other problems are treated as in mongoscript.py, so records
+with bad coordinates are stored with null coordinates and listed under
+"flagged".
+
+The rollup (the per station / make / time slot / day counters the dashboard
+reads, see rollup.py) is updated in the same pass when it was current: new
+documents are added and the documents they replace are taken off. A batch
+reads the documents it replaces in one find and writes in one unordered
+bulk_write, each replace conditional on the stored revision (REVISION_FIELD)
+it read, so records that another batch wrote meanwhile are retried instead
+of being counted twice (see _replace_checked). The dataset version is then
+bumped, so API workers pick up the change on their next version poll
+(CACHE_VERSION_POLL_SECONDS) without a recompute. A stale rollup is left
+stale; `python rollup.py rebuild` brings it back.
+"""
+import argparse
+import json
+import time
+
+import pandas as pd
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from cleaning import clean_frame, rejected_rows, to_documents
+from mongodb import bump_dataset_version, get_sync_database
+from mongoscript import TEXT_COLUMNS
+from rollup import apply_rollup_deltas, mark_rollup_version, rollup_is_current
+
+# Largest batch the API accepts in one request.
+MAX_BATCH_RECORDS = 5000
+# Counter bumped by every write here; a replace applies only to the revision
+# it was computed from.
+REVISION_FIELD = "_rev"
+# Rounds of re-reading and retrying records other batches wrote meanwhile.
+MAX_WRITE_ATTEMPTS = 5
+DUPLICATE_KEY = 11000
+
+
+def _case_filter(case_no):
+    # Same shape as theft.case_no_condition, so the upsert uses case_no_unique.
+    return {"CaseNo": {"$eq": case_no, "$type": "string"}}
+
+
+def upsert_frame(db, frame: pd.DataFrame, dayfirst=False, date_format=None, keep_invalid=False,
+                 reject_bad_coords=False, rollup_live=False):
+    """Clean and upsert one batch; returns stats with per-row rejections and
+    the rows kept despite a problem."""
+    stats = {"received": len(frame), "inserted": 0, "updated": 0, "unchanged": 0, "failed": 0,
+             "rejected": [], "flagged": []}
+    if frame.empty:
+        return stats
+    frame = frame.reset_index(drop=True)
+    if "CaseNo" in frame.columns:
+        case_no = frame["CaseNo"].astype("string").str.strip()
+        frame["CaseNo"] = case_no.mask(case_no == "")
+    else:
+        frame["CaseNo"] = pd.NA
+
+    clean, reasons = clean_frame(frame, dayfirst=dayfirst, date_format=date_format)
+    missing_case = clean["CaseNo"].isna()
+    reasons = reasons.mask(missing_case, (reasons + ";missing_case_no").str.lstrip(";"))
+    rejected = missing_case | (rejected_rows(reasons, reject_bad_coords) & (not keep_invalid))
+    for row in reasons[reasons != ""].index:
+        case = frame.at[row, "CaseNo"]
+        stats["rejected" if rejected[row] else "flagged"].append(
+            {"row": int(row), "CaseNo": None if pd.isna(case) else case, "reason": reasons[row]}
+        )
+
+    # The last record for a CaseNo wins within a batch, as it would across
+    # batches.
+    docs = {doc["CaseNo"]: doc for doc in to_documents(clean[~rejected])}
+    if not docs:
+        return stats
+
+    written, replaced = _replace_checked(db["thefts"], list(docs.values()), stats)
+    if rollup_live:
+        apply_rollup_deltas(db, written, removed=replaced)
+    return stats
+
+
+def _reject_write(stats, case_no, reason):
+    stats["rejected"].append({"row": None, "CaseNo": case_no, "reason": reason})
+    stats["failed"] += 1
+
+
+def _replace_checked(thefts, docs, stats):
+    """Write docs as unordered bulk_writes, each replace conditional on the
+    revision it was computed from; returns (written, replaced).
+
+    The documents being replaced are read first, in one find. A replace whose
+    document changed in the meantime (another batch wrote the same CaseNo)
+    matches nothing, and its upsert then fails on case_no_unique, so exactly
+    the conflicting records are known, re-read and retried. Rollup deltas
+    are taken off the documents that were actually replaced.
+    """
+    written, replaced = [], []
+    pending = docs
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        current = thefts.find(
+            {"CaseNo": {"$in": [doc["CaseNo"] for doc in pending], "$type": "string"}}, {"_id": 0}
+        )
+        current = {old["CaseNo"]: old for old in current}
+        ops, batch = [], []
+        for doc in pending:
+            old = current.get(doc["CaseNo"])
+            revision = None if old is None else old.pop(REVISION_FIELD, None)
+            if old == doc:
+                stats["unchanged"] += 1
+                continue
+            ops.append(ReplaceOne({**_case_filter(doc["CaseNo"]), REVISION_FIELD: revision},
+                                  {**doc, REVISION_FIELD: (revision or 0) + 1}, upsert=True))
+            batch.append((doc, old))
+        if not ops:
+            return written, replaced
+
+        errors = {}
+        try:
+            thefts.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            errors = {err["index"]: err for err in e.details.get("writeErrors", [])}
+        pending = []
+        for index, (doc, old) in enumerate(batch):
+            err = errors.get(index)
+            if err is None:
+                written.append(doc)
+                stats["inserted" if old is None else "updated"] += 1
+                if old is not None:
+                    replaced.append(old)
+            elif err.get("code") == DUPLICATE_KEY:
+                pending.append(doc)
+            else:
+                _reject_write(stats, doc["CaseNo"], err.get("errmsg", "write_error"))
+        if not pending:
+            return written, replaced
+    for doc in pending:
+        _reject_write(stats, doc["CaseNo"], "write_conflict")
+    return written, replaced
+
+
+def publish(db, rollup_live: bool):
+    """Bump the dataset version, carrying a rollup kept current along."""
+    version = bump_dataset_version(db)
+    if rollup_live:
+        mark_rollup_version(db, version)
+    return version
+
+
+def _changed(stats):
+    return stats["inserted"] or stats["updated"]
+
+
+def ingest_records(records: list, dayfirst=False, date_format=None, keep_invalid=False, reject_bad_coords=False,
+                   db=None):
+    """One API batch: upsert, update the rollup and publish."""
+    db = db if db is not None else get_sync_database()
+    rollup_live = rollup_is_current(db)
+    stats = upsert_frame(
+        db, pd.DataFrame.from_records(records), dayfirst=dayfirst, date_format=date_format,
+        keep_invalid=keep_invalid, reject_bad_coords=reject_bad_coords, rollup_live=rollup_live
+    )
+    if _changed(stats):
+        stats["dataset_version"] = publish(db, rollup_live)
+    stats["rollup"] = "updated" if rollup_live else "stale"
+    return stats
+
+
+def _read_batches(path, batch_size):
+    if path.endswith(".csv"):
+        yield from pd.read_csv(path, chunksize=batch_size, dtype=TEXT_COLUMNS)
+        return
+    with open(path) as f:
+        if path.endswith(".ndjson"):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            records = json.load(f)
+    for start in range(0, len(records), batch_size):
+        yield pd.DataFrame.from_records(records[start:start + batch_size])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV, JSON array or NDJSON file of theft records")
+    parser.add_argument("--batch-size", type=int, default=1000, help="records per bulk_write")
+    parser.add_argument("--dayfirst", action="store_true", help="parse DATE as day-first (e.g. 05/01/2024 = 5 Jan)")
+    parser.add_argument("--date-format", default=None, help='explicit DATE format, e.g. "%%d-%%m-%%Y", or "mixed"')
+    parser.add_argument("--keep-invalid", action="store_true",
+                        help="store every record with a CaseNo, with bad coordinates/dates set to null")
+    parser.add_argument("--reject-bad-coords", action="store_true",
+                        help="reject records with unusable coordinates instead of storing null coordinates")
+    args = parser.parse_args(argv)
+
+    db = get_sync_database()
+    rollup_live = rollup_is_current(db)
+    totals = {"received": 0, "inserted": 0, "updated": 0, "unchanged": 0, "failed": 0, "rejected": 0, "flagged": 0}
+    reasons = {}
+    started = time.perf_counter()
+    for batch_no, frame in enumerate(_read_batches(args.path, args.batch_size)):
+        stats = upsert_frame(db, frame, dayfirst=args.dayfirst, date_format=args.date_format,
+                             keep_invalid=args.keep_invalid, reject_bad_coords=args.reject_bad_coords,
+                             rollup_live=rollup_live)
+        for row in stats.pop("rejected"):
+            reasons[row["reason"]] = reasons.get(row["reason"], 0) + 1
+            totals["rejected"] += 1
+        totals["flagged"] += len(stats.pop("flagged"))
+        for key, value in stats.items():
+            totals[key] += value
+        print(f"batch {batch_no + 1}: {totals['received']} received, {totals['inserted']} inserted, "
+              f"{totals['updated']} updated, {totals['rejected']} rejected")
+
+    # One version bump for the whole file rather than one per batch.
+    if _changed(totals):
+        publish(db, rollup_live)
+    print(f"✅ {totals['inserted']} inserted, {totals['updated']} updated, {totals['unchanged']} unchanged of "
+          f"{totals['received']} records in {time.perf_counter() - started:.2f}s; {totals['failed']} failed writes, "
+          f"{totals['flagged']} stored with problems.")
+    if reasons:
+        print("⚠ Rejected: " + ", ".join(f"{reason} ({n})" for reason, n in sorted(reasons.items())))
+    if not rollup_live:
+        print("ℹ The rollup was not current and has not been updated; run `python rollup.py rebuild`.")
+
+
+if __name__ == "__main__":
+    main()
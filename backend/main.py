@@ -1,10 +1,62 @@
-from fastapi import FastAPI
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from theft import router as theft_router
+import mongodb
+from admission import AdmissionMiddleware
+from columnar import columnar_engine
+from compression import CompressionMiddleware
+from indexes import ensure_indexes, missing_indexes
+from metrics import MetricsMiddleware, render_metrics
+from responses import FastJSONResponse
+from theft import prewarm, router as theft_router
+from workers import shutdown_process_pool
+
+logger = logging.getLogger("rideshield")
+
+# Warm the hot caches and the PDF workers before accepting traffic. Off by
+# default: it adds a few aggregations to every worker start.
+PREWARM = os.getenv("PREWARM", "0") == "1"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await mongodb.connect()
+    # Opens the pool now, so an unreachable server fails the worker at start
+    # rather than on its first request.
+    await mongodb.ping()
+    # Idempotent: existing indexes are left untouched.
+    await ensure_indexes()
+    missing = await missing_indexes()
+    if missing:
+        logger.warning("Indexes not ready, filtered queries may scan the collection: %s", ", ".join(missing))
+    # Start loading the snapshot now rather than on the first request.
+    await columnar_engine.current()
+    if PREWARM:
+        started = time.perf_counter()
+        try:
+            await prewarm()
+            logger.info("Caches and PDF workers warmed in %.2fs", time.perf_counter() - started)
+        except Exception:
+            # Only costs a cold first request; not a reason to refuse traffic.
+            logger.exception("Warm-up failed")
+    try:
+        yield
+    finally:
+        shutdown_process_pool()
+        await mongodb.close()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+app.add_middleware(CompressionMiddleware)
+# Inside the metrics middleware, so rejected requests are counted as 503s,
+# and inside CORS, so the dashboard can read them as retryable 503s.
+app.add_middleware(AdmissionMiddleware, fastapi_app=app)
 
- 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],   
@@ -13,9 +65,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Added last so it wraps everything, CORS and compression included.
+app.add_middleware(MetricsMiddleware, fastapi_app=app)
+
 # Include theft routes
 app.include_router(theft_router, prefix="/api")
 
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.get("/")
 def root():
     return {"message": "Backend running!"}
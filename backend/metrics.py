@@ -0,0 +1,202 @@
+"""Request and MongoDB metrics in Prometheus format.
+
+MetricsMiddleware records per-route request counts, latency histograms and
+in-flight gauges; routes are labelled by their path template
+("/api/theft-data"), never the raw URL, to keep cardinality bounded. The
+Mongo listeners are passed to the API client in mongodb.connect() and record
+per-command durations and returned documents plus connection-pool checkout
+waits. Everything is served by main.py at /metrics.
+
+Metrics live in this process only; with several uvicorn workers each one
+reports its own numbers.
+"""
+import json
+import logging
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from pymongo import monitoring
+from starlette.routing import compile_path
+
+logger = logging.getLogger("rideshield.slow_requests")
+
+# Requests slower than this are logged with their filters; 0 disables the log.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+REQUESTS = Counter("http_requests_total", "HTTP requests handled", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time until the last body byte is sent",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+IN_FLIGHT = Gauge("http_requests_in_progress", "Requests currently being handled", ["method", "route"])
+REJECTED_REQUESTS = Counter(
+    "http_requests_rejected_total", "Requests turned away by the per-route concurrency limit", ["route"]
+)
+QUERY_TIMEOUTS = Counter("mongo_query_timeouts_total", "Requests whose Mongo read hit maxTimeMS", ["route"])
+COALESCING_LEADERS = Counter(
+    "singleflight_computations_total", "Computations started by the single-flight layer", ["route"]
+)
+COALESCED_REQUESTS = Counter(
+    "singleflight_coalesced_total", "Requests that awaited an identical in-flight computation", ["route"]
+)
+
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command round-trip time", ["command"], buckets=MONGO_BUCKETS
+)
+MONGO_COMMAND_FAILURES = Counter("mongo_command_failures_total", "Failed MongoDB commands", ["command"])
+MONGO_DOCUMENTS_RETURNED = Counter(
+    "mongo_documents_returned_total", "Documents returned in find/aggregate/getMore batches", ["command"]
+)
+MONGO_CHECKOUT_WAIT = Histogram(
+    "mongo_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", buckets=MONGO_BUCKETS
+)
+MONGO_CHECKOUT_FAILURES = Counter("mongo_pool_checkout_failures_total", "Failed connection checkouts", ["reason"])
+MONGO_CONNECTIONS = Gauge("mongo_pool_connections", "Open pooled connections")
+MONGO_CHECKED_OUT = Gauge("mongo_pool_checked_out_connections", "Connections currently checked out")
+
+
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def _route_paths(routes, prefix=""):
+    for route in routes:
+        path = getattr(route, "path", None)
+        if isinstance(path, str):
+            yield prefix + path
+            continue
+        # Newer FastAPI keeps an included router as a wrapper instead of
+        # copying its routes with the prefix applied.
+        context = getattr(route, "include_context", None)
+        router = getattr(route, "original_router", None)
+        if context is not None and router is not None:
+            yield from _route_paths(router.routes, prefix + context.prefix)
+
+
+class RouteTemplates:
+    """Maps a request path to the route template it will be served by.
+
+    Built once from the app's routes, including those of included routers,
+    with their path convertors ({case_no:path}); static paths are tried
+    before parameterised ones, as the router does for the routes we declare.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._compiled = None
+
+    def resolve(self, path: str) -> str:
+        if self._compiled is None:
+            ordered = sorted(set(_route_paths(self.app.routes)), key=lambda p: (p.count("{"), p))
+            self._compiled = [(compile_path(p)[0], p) for p in ordered]
+        for regex, template in self._compiled:
+            if regex.match(path):
+                return template
+        return "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed bodies are timed to their last chunk."""
+
+    def __init__(self, app, fastapi_app):
+        self.app = app
+        self.routes = RouteTemplates(fastapi_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self.routes.resolve(scope["path"])
+        status = 500
+        start = time.perf_counter()
+        in_flight = IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            REQUESTS.labels(method, route, str(status)).inc()
+            REQUEST_LATENCY.labels(method, route).observe(elapsed)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                _log_slow(scope, method, route, status, elapsed)
+
+
+def _log_slow(scope, method, route, status, elapsed):
+    # filter_params stashes the parsed Mongo filter on the request state.
+    query = scope.get("state", {}).get("filter_query")
+    logger.warning(
+        "slow request %s %s status=%s duration_ms=%.1f params=%s filter=%s",
+        method, route, status, elapsed * 1000,
+        scope.get("query_string", b"").decode("latin-1") or "-",
+        json.dumps(query, default=str) if query is not None else "-"
+    )
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name).observe(event.duration_micros / 1e6)
+        cursor = event.reply.get("cursor") if isinstance(event.reply, dict) else None
+        if cursor:
+            batch = cursor.get("firstBatch", cursor.get("nextBatch", []))
+            MONGO_DOCUMENTS_RETURNED.labels(event.command_name).inc(len(batch))
+
+    def failed(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(event.command_name).inc()
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_CONNECTIONS.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_CONNECTIONS.dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_CHECKOUT_WAIT.observe(event.duration)
+        MONGO_CHECKOUT_FAILURES.labels(event.reason).inc()
+
+    def connection_checked_out(self, event):
+        MONGO_CHECKOUT_WAIT.observe(event.duration)
+        MONGO_CHECKED_OUT.inc()
+
+    def connection_checked_in(self, event):
+        MONGO_CHECKED_OUT.dec()
+
+
+MONGO_LISTENERS = [CommandMetrics(), PoolMetrics()]
@@ -0,0 +1,114 @@
+"""Convert DATE values still stored as CSV text into real datetimes.
+
+Usage (from backend/):
+    python migrate_dates.py [--dayfirst] [--date-format FMT] [--chunk-size 5000]
+        [--checkpoint FILE] [--reset] [--no-rollup]
+
+Date range filters, the trends endpoint and the report only see documents
+whose DATE is a datetime, since that is what the DATE indexes can range
+scan. Loads made with mongoscript.py since the chunked ingest already store
+datetimes; this converts older documents in place, with the same parsing
+rules (cleaning.parse_dates) and the same resumable, checkpointed chunking
+as repair_coords.py. Values that cannot be parsed are left as they are and
+counted as skipped. The rollup is rebuilt afterwards because converted
+documents move into a "day".
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+from pymongo import UpdateOne
+
+from cleaning import parse_dates
+from mongodb import bump_dataset_version, get_sync_database
+from repair_coords import load_checkpoint, save_checkpoint
+from rollup import rebuild
+
+STRING_DATES = {"DATE": {"$type": "string"}}
+
+
+def migrate_chunk(collection, docs, dayfirst=False, date_format=None):
+    """Parse one chunk and write it back; returns (modified, skipped)."""
+    df = pd.DataFrame(docs, columns=["_id", "DATE"])
+    parsed = parse_dates(df["DATE"].str.strip(), dayfirst=dayfirst, date_format=date_format)
+    valid = parsed.notna()
+
+    ops = [
+        UpdateOne({"_id": _id}, {"$set": {"DATE": ts.to_pydatetime()}})
+        for _id, ts in zip(df["_id"][valid], parsed[valid])
+    ]
+    modified = collection.bulk_write(ops, ordered=False).modified_count if ops else 0
+    return modified, int((~valid).sum())
+
+
+def migrate(chunk_size=5000, checkpoint_path=".migrate_dates.checkpoint", reset=False,
+            dayfirst=False, date_format=None, update_rollup=True):
+    db = get_sync_database()
+    collection = db["thefts"]
+
+    last_id = None if reset else load_checkpoint(checkpoint_path)
+    selector = STRING_DATES if last_id is None else {**STRING_DATES, "_id": {"$gt": last_id}}
+    if last_id is not None:
+        print(f"Resuming after _id {last_id}")
+
+    stats = {"scanned": 0, "modified": 0, "skipped": 0}
+    started = time.perf_counter()
+    cursor = collection.find(selector, {"DATE": 1}).sort("_id", 1).batch_size(chunk_size)
+
+    def flush(docs):
+        modified, skipped = migrate_chunk(collection, docs, dayfirst=dayfirst, date_format=date_format)
+        stats["scanned"] += len(docs)
+        stats["modified"] += modified
+        stats["skipped"] += skipped
+        save_checkpoint(checkpoint_path, docs[-1]["_id"], stats)
+        elapsed = time.perf_counter() - started
+        print(f"{stats['scanned']} scanned, {stats['modified']} converted, {stats['skipped']} skipped "
+              f"({stats['scanned'] / elapsed:,.0f} docs/s)")
+
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    if stats["modified"]:
+        # Let running API workers drop their cached results.
+        bump_dataset_version(db)
+        if update_rollup:
+            rebuild(db)
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dayfirst", action="store_true", help="parse DATE as day-first (e.g. 05/01/2024 = 5 Jan)")
+    parser.add_argument("--date-format", default=None, help='explicit DATE format, e.g. "%%d-%%m-%%Y", or "mixed"')
+    parser.add_argument("--chunk-size", type=int, default=5000, help="documents per bulk_write")
+    parser.add_argument("--checkpoint", default=".migrate_dates.checkpoint", help="progress file used to resume")
+    parser.add_argument("--reset", action="store_true", help="ignore any saved checkpoint and start over")
+    parser.add_argument("--no-rollup", action="store_true", help="skip the rollup rebuild at the end")
+    args = parser.parse_args(argv)
+
+    stats = migrate(
+        chunk_size=args.chunk_size,
+        checkpoint_path=args.checkpoint,
+        reset=args.reset,
+        dayfirst=args.dayfirst,
+        date_format=args.date_format,
+        update_rollup=not args.no_rollup,
+    )
+    rate = stats["scanned"] / stats["seconds"] if stats["seconds"] else 0
+    print(f"✅ Converted {stats['modified']} of {stats['scanned']} documents in {stats['seconds']}s "
+          f"({rate:,.0f} docs/s); {stats['skipped']} could not be parsed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,86 @@
-from pymongo import MongoClient
+import os
 
-client = MongoClient("mongodb://localhost:27017/")
-db = client["theft_db"]
-thefts_collection = db["thefts"]
\ No newline at end of file
+from pymongo import AsyncMongoClient, MongoClient, ReturnDocument
+
+from metrics import MONGO_LISTENERS
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB = os.getenv("MONGO_DB", "theft_db")
+
+# Pool and timeout settings shared by the API (async) and CLI (sync) clients.
+# maxPoolSize bounds concurrent operations per worker; requests beyond it wait
+# up to waitQueueTimeoutMS for a connection instead of queueing forever.
+CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "5")),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000")),
+    "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")),
+    "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+}
+
+# Server-side budget passed as maxTimeMS on every API read.
+MAX_TIME_MS = int(os.getenv("MONGO_MAX_TIME_MS", "10000"))
+# Most documents an unpaged JSON response is built from; larger results have
+# to be paged or streamed instead of being held in memory.
+MAX_RESULT_ROWS = int(os.getenv("MONGO_MAX_RESULT_ROWS", "200000"))
+
+DATASET_VERSION_ID = "dataset_version"
+
+_client = None
+_sync_client = None
+
+
+async def connect():
+    """Open the API's async client. Called from the app lifespan."""
+    global _client
+    if _client is None:
+        _client = AsyncMongoClient(MONGO_URI, event_listeners=MONGO_LISTENERS, **CLIENT_OPTIONS)
+    return _client
+
+
+async def ping():
+    """Round trip to the server; opens the first pooled connection."""
+    await get_database().command("ping")
+
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def get_database():
+    if _client is None:
+        raise RuntimeError("MongoDB client is not connected; mongodb.connect() runs in the app lifespan")
+    return _client[MONGO_DB]
+
+
+def get_thefts_collection():
+    return get_database()["thefts"]
+
+
+def get_meta_collection():
+    return get_database()["meta"]
+
+
+def get_sync_database():
+    """Blocking client for command-line tools (ingest, repair, profiling)."""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = MongoClient(MONGO_URI, **CLIENT_OPTIONS)
+    return _sync_client[MONGO_DB]
+
+
+def bump_dataset_version(database=None):
+    """Mark the thefts data as changed so cached API results are dropped."""
+    database = database if database is not None else get_sync_database()
+    doc = database["meta"].find_one_and_update(
+        {"_id": DATASET_VERSION_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc["version"]
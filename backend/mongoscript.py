@@ -1,23 +1,146 @@
+"""Load a thefts CSV into MongoDB.
+
+Usage (from backend/):
+    python mongoscript.py path/to/thefts.csv [--drop] [--chunksize 10000]
+        [--batch-size 1000] [--dayfirst] [--date-format FMT]
+        [--rejects rejected_rows.csv] [--reject-bad-coords] [--keep-invalid] [--no-rollup]
+
+The CSV is read in chunks. Coordinates and dates are cleaned with vectorized
+pandas operations (see cleaning.py) and stored typed: float
+LATITUDE/LONGITUDE, a datetime DATE and whitespace-trimmed Make/MAKE.
+Documents are written with unordered bulk_write batches. Every row with a
+problem is listed in the rejected-row report. Rows with unusable dates are
+left out unless --keep-invalid loads them with DATE set to null. Rows with
+unusable coordinates are loaded with null coordinates, as the old loader
+kept them, unless --reject-bad-coords leaves them out too.
+
+The rollup cubes (see rollup.py) are kept current: inserted documents are
+added to them chunk by chunk when they were current before the load, otherwise
+they are rebuilt once at the end.
+"""
+import argparse
+import time
+
 import pandas as pd
-from pymongo import MongoClient
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+
+from cleaning import clean_frame, rejected_rows, to_documents
+from mongodb import bump_dataset_version, get_sync_database
+from rollup import apply_rollup_deltas, mark_rollup_version, rebuild, rollup_is_current
+
+# Columns cleaned or used as keys are read as text so pandas does not guess
+# different types for different chunks.
+TEXT_COLUMNS = {"CaseNo": str, "LATITUDE": str, "LONGITUDE": str, "DATE": str}
+
+
+def write_batches(collection, documents, batch_size):
+    """Insert documents with unordered bulk writes; returns (written, failed)
+    where written lists the documents that were actually inserted."""
+    written = []
+    failed = 0
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        try:
+            collection.bulk_write([InsertOne(doc) for doc in batch], ordered=False)
+            written.extend(batch)
+        except BulkWriteError as e:
+            errors = {err["index"] for err in e.details.get("writeErrors", [])}
+            written.extend(doc for i, doc in enumerate(batch) if i not in errors)
+            failed += len(errors)
+    return written, failed
+
+
+def ingest(path, drop=False, chunksize=10000, batch_size=1000, dayfirst=False,
+           date_format=None, rejects_path="rejected_rows.csv", keep_invalid=False, reject_bad_coords=False,
+           update_rollup=True):
+    db = get_sync_database()
+    collection = db["thefts"]
+    if drop:
+        collection.drop()
+    # Only apply deltas to a rollup that matched the data before this load.
+    rollup_live = update_rollup and not drop and rollup_is_current(db)
+
+    stats = {"read": 0, "inserted": 0, "rejected": 0, "flagged": 0, "failed": 0}
+    started = time.perf_counter()
+    wrote_rejects = False
+
+    for chunk_no, chunk in enumerate(pd.read_csv(path, chunksize=chunksize, dtype=TEXT_COLUMNS)):
+        stats["read"] += len(chunk)
+        # CSV line number (header is line 1) for the rejected-row report.
+        raw = chunk.assign(_line=chunk.index + 2)
+
+        clean, reasons = clean_frame(chunk, dayfirst=dayfirst, date_format=date_format)
+        problems = reasons != ""
+        rejected = rejected_rows(reasons, reject_bad_coords) & (not keep_invalid)
+        if problems.any():
+            report = raw[problems].assign(
+                _reason=reasons[problems], _action=rejected[problems].map({True: "rejected", False: "kept"})
+            )
+            report.to_csv(rejects_path, mode="a" if wrote_rejects else "w", header=not wrote_rejects, index=False)
+            wrote_rejects = True
+            stats["rejected"] += int(rejected.sum())
+            stats["flagged"] += int((problems & ~rejected).sum())
+
+        to_load = clean[~rejected]
+        written, failed = write_batches(collection, to_documents(to_load), batch_size)
+        stats["inserted"] += len(written)
+        stats["failed"] += failed
+        if rollup_live and written:
+            apply_rollup_deltas(db, written)
+
+        elapsed = time.perf_counter() - started
+        print(f"chunk {chunk_no + 1}: {stats['read']} rows read, {stats['inserted']} inserted, "
+              f"{stats['rejected']} rejected ({stats['read'] / elapsed:,.0f} rows/s)")
+
+    if stats["inserted"] or drop:
+        # Let running API workers drop their cached results.
+        version = bump_dataset_version(db)
+        if rollup_live:
+            mark_rollup_version(db, version)
+        elif update_rollup:
+            stats["rollup_rows"] = rebuild(db)["rows"]
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    if wrote_rejects:
+        stats["rejects_report"] = rejects_path
+    return stats
 
-# 1. Load CSV file
-file_path = r"C:\Users\patil\Downloads\cleaned_data (2).csv"
-df = pd.read_csv(file_path)
 
-# 2. Connect to MongoDB (make sure MongoDB service is running locally)
-client = MongoClient("mongodb://localhost:27017/")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_path")
+    parser.add_argument("--drop", action="store_true", help="drop the thefts collection before loading")
+    parser.add_argument("--chunksize", type=int, default=10000, help="CSV rows per chunk")
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents per bulk_write")
+    parser.add_argument("--dayfirst", action="store_true", help="parse DATE as day-first (e.g. 05/01/2024 = 5 Jan)")
+    parser.add_argument("--date-format", default=None, help='explicit DATE format, e.g. "%%d-%%m-%%Y", or "mixed"')
+    parser.add_argument("--rejects", default="rejected_rows.csv", help="where to write the rejected-row report")
+    parser.add_argument("--keep-invalid", action="store_true",
+                        help="load every row, with bad coordinates/dates set to null")
+    parser.add_argument("--reject-bad-coords", action="store_true",
+                        help="leave out rows with unusable coordinates instead of loading them with null coordinates")
+    parser.add_argument("--no-rollup", action="store_true",
+                        help="leave the rollup collection alone (it goes stale until `python rollup.py rebuild`)")
+    args = parser.parse_args(argv)
 
-# 3. Choose database & collection
-db = client["theft_db"]       # database name
-collection = db["thefts"]     # collection name
+    stats = ingest(
+        args.csv_path,
+        drop=args.drop,
+        chunksize=args.chunksize,
+        batch_size=args.batch_size,
+        dayfirst=args.dayfirst,
+        date_format=args.date_format,
+        rejects_path=args.rejects,
+        keep_invalid=args.keep_invalid,
+        reject_bad_coords=args.reject_bad_coords,
+        update_rollup=not args.no_rollup,
+    )
+    print(f"✅ Inserted {stats['inserted']} of {stats['read']} rows in {stats['seconds']}s; "
+          f"{stats['rejected']} rejected, {stats['flagged']} kept with problems, {stats['failed']} failed writes.")
+    if stats.get("rejects_report"):
+        print(f"⚠ Rejected and flagged rows written to {stats['rejects_report']}")
 
-# 4. Convert DataFrame to dictionary
-data = df.to_dict(orient="records")
 
- 
-if data:   
-    collection.insert_many(data)
-    print(f"✅ Inserted {len(data)} records into MongoDB!")
-else:
-    print("⚠ No data found in CSV.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+TITLE = "Filtered Bike Theft Reports"
+
+# (field, header, column width in mm); widths add up to the 190 mm of usable
+# A4 width, so each case is one table row instead of six stacked lines.
+COLUMNS = [
+    ("CaseNo", "Case No", 30),
+    ("Make", "Make", 28),
+    ("MAKE", "Model", 40),
+    ("POLICE_STATION", "Police Station", 42),
+    ("DATE", "Date", 26),
+    ("STATUS", "Status", 24),
+]
+ROW_HEIGHT = 5
+FONT = "Helvetica"
+
+
+def _latin1(value) -> str:
+    # The core PDF fonts are latin-1 only.
+    text = "" if value is None else str(value)
+    return text.encode("latin-1", "replace").decode("latin-1")
+
+
+def _fit(pdf, text: str, width: float) -> str:
+    if pdf.get_string_width(text) <= width - 2:
+        return text
+    while text and pdf.get_string_width(text + "...") > width - 2:
+        text = text[:-1]
+    return text + "..."
+
+
+def _header(pdf):
+    pdf.set_font(FONT, style="B", size=8)
+    pdf.set_fill_color(230, 230, 230)
+    for _, header, width in COLUMNS:
+        pdf.cell(width, ROW_HEIGHT + 1, header, border=1, align="L", fill=True)
+    pdf.ln(ROW_HEIGHT + 1)
+    pdf.set_font(FONT, size=8)
+
+
+def preload():
+    """Import fpdf ahead of the first render (used to warm the PDF workers)."""
+    import fpdf  # noqa: F401
+
+
+def render_cases_pdf(cases) -> bytes:
+    """Render case rows as a paginated table and return the PDF bytes.
+
+    Runs in a worker process, so it only takes and returns plain data.
+    """
+    # Imported here so the API process only pays for fpdf when a PDF is made.
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(False)
+    pdf.add_page()
+
+    pdf.set_font(FONT, style="B", size=14)
+    pdf.cell(0, 10, TITLE)
+    pdf.ln(10)
+    pdf.set_font(FONT, size=9)
+    pdf.cell(0, 6, f"{len(cases)} case(s)")
+    pdf.ln(8)
+    _header(pdf)
+
+    bottom = pdf.h - pdf.b_margin - 10
+    for case in cases:
+        if pdf.get_y() + ROW_HEIGHT > bottom:
+            pdf.add_page()
+            _header(pdf)
+        for field, _, width in COLUMNS:
+            pdf.cell(width, ROW_HEIGHT, _fit(pdf, _latin1(case.get(field)), width), border=1)
+        pdf.ln(ROW_HEIGHT)
+
+    return bytes(pdf.output())
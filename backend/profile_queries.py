@@ -0,0 +1,154 @@
+"""Explain every route's query under representative filters.
+
+Usage (from backend/):
+    python profile_queries.py [--max-ratio 1.5] [--json]
+
+For each route and filter shape it runs explain("executionStats") and prints
+the winning plan, docs/keys examined, docs matched and docs returned. The
+exit status is 1 when a filtered query falls back to a COLLSCAN or examines
+more than --max-ratio documents per matched document, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+from datetime import timedelta
+
+from analytics import FACETS
+from heatmap import DEFAULT_CELL, heatmap_pipeline
+from mongodb import get_sync_database
+from theft import THEFT_DATA_PROJECTION, build_filter_query
+
+FILTER_FIELDS = {
+    "localities": "POLICE_STATION",
+    "places": "PLACE",
+    "company": "Make",
+    "categories": "Category",
+    "time_of_day": "Time_of_day",
+    "days": "DAY",
+    "spot_types": "SPOT",
+}
+LIST_FILTERS = {"localities", "places", "categories", "days", "spot_types"}
+
+
+def most_common_value(thefts_collection, field):
+    rows = list(thefts_collection.aggregate([
+        {"$match": {field: {"$ne": None}}},
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": 1}
+    ]))
+    return rows[0]["_id"] if rows else None
+
+
+def representative_filters(thefts_collection):
+    """One unfiltered shape, one per filter field and the common combinations."""
+    values = {param: most_common_value(thefts_collection, field) for param, field in FILTER_FIELDS.items()}
+
+    def kwargs(*params):
+        out = {}
+        for param in params:
+            value = values[param]
+            if value is None:
+                return None
+            out[param] = [value] if param in LIST_FILTERS else value
+        return out
+
+    shapes = {"unfiltered": {}}
+    for param in FILTER_FIELDS:
+        shapes[param] = kwargs(param)
+    shapes["localities+time_of_day"] = kwargs("localities", "time_of_day")
+    shapes["localities+company"] = kwargs("localities", "company")
+    shapes["company+time_of_day"] = kwargs("company", "time_of_day")
+
+    latest = thefts_collection.find_one({"DATE": {"$type": "date"}}, {"DATE": 1}, sort=[("DATE", -1)])
+    if latest:
+        last_30_days = {"date_from": latest["DATE"] - timedelta(days=29), "date_to": latest["DATE"]}
+        shapes["last_30_days"] = last_30_days
+        if kwargs("localities"):
+            shapes["localities+last_30_days"] = {**kwargs("localities"), **last_30_days}
+        if kwargs("company"):
+            shapes["company+last_30_days"] = {**kwargs("company"), **last_30_days}
+
+    return {name: build_filter_query(**kw) for name, kw in shapes.items() if kw is not None}
+
+
+def route_commands(coll, query):
+    """The explainable command each route issues for a given filter."""
+    commands = {
+        "dashboard": {"aggregate": coll, "pipeline": [{"$match": query}, {"$facet": FACETS}], "cursor": {}},
+        "theft_data": {"find": coll, "filter": query, "projection": THEFT_DATA_PROJECTION},
+        "thefts_heatmap": {"aggregate": coll, "pipeline": heatmap_pipeline(query, DEFAULT_CELL), "cursor": {}},
+    }
+    for name, stages in FACETS.items():
+        commands[name] = {"aggregate": coll, "pipeline": [{"$match": query}, *stages], "cursor": {}}
+    return commands
+
+
+def _collect(node, key, out):
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k == key:
+                out.append(v)
+            _collect(v, key, out)
+    elif isinstance(node, list):
+        for v in node:
+            _collect(v, key, out)
+    return out
+
+
+def summarize(explain):
+    stats = _collect(explain, "executionStats", [])
+    returned = stats[0].get("nReturned") if stats else None
+    winning_stages = _collect(_collect(explain, "winningPlan", []), "stage", [])
+    return {
+        "plan": "COLLSCAN" if "COLLSCAN" in winning_stages else "IXSCAN",
+        "docs_examined": sum(_collect(stats, "totalDocsExamined", [])),
+        "keys_examined": sum(_collect(stats, "totalKeysExamined", [])),
+        "returned": returned,
+    }
+
+
+def profile(max_ratio=None):
+    db = get_sync_database()
+    thefts_collection = db["thefts"]
+    rows = []
+    for shape, query in representative_filters(thefts_collection).items():
+        matched = thefts_collection.count_documents(query)
+        for route, command in route_commands(thefts_collection.name, query).items():
+            explain = db.command("explain", command, verbosity="executionStats")
+            row = {"route": route, "filter": shape, "matched": matched, **summarize(explain)}
+            row["ratio"] = round(row["docs_examined"] / matched, 2) if matched else None
+
+            problems = []
+            if query and row["plan"] == "COLLSCAN":
+                problems.append("collscan")
+            if max_ratio is not None and row["ratio"] is not None and row["ratio"] > max_ratio:
+                problems.append("ratio")
+            row["problems"] = problems
+            rows.append(row)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-ratio", type=float, default=None,
+                        help="fail when docs examined / docs matched exceeds this")
+    parser.add_argument("--json", action="store_true", help="print rows as JSON")
+    args = parser.parse_args(argv)
+
+    rows = profile(max_ratio=args.max_ratio)
+    if args.json:
+        print(json.dumps(rows, indent=2, default=str))
+    else:
+        header = f"{'route':<24}{'filter':<24}{'plan':<10}{'examined':>10}{'keys':>10}{'matched':>10}{'returned':>10}{'ratio':>8}  problems"
+        print(header)
+        print("-" * len(header))
+        for r in rows:
+            print(f"{r['route']:<24}{r['filter']:<24}{r['plan']:<10}{r['docs_examined']:>10}{r['keys_examined']:>10}"
+                  f"{r['matched']:>10}{str(r['returned']):>10}{str(r['ratio']):>8}  {','.join(r['problems'])}")
+
+    return 1 if any(r["problems"] for r in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
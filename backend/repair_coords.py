@@ -0,0 +1,126 @@
+"""Convert LATITUDE/LONGITUDE values still stored as strings into floats and
+backfill the GeoJSON location point (see geo.py).
+
+Usage (from backend/, or via ../pythonscripts.py):
+    python repair_coords.py [--chunk-size 5000] [--checkpoint FILE] [--reset]
+
+Only documents whose coordinates are still strings or that have no location
+yet are read, in _id order.
+Each chunk is cleaned with the vectorized rules in cleaning.py and written
+back with one unordered bulk_write. After every chunk the last _id is saved
+to the checkpoint file, so an interrupted run resumes where it stopped. The
+checkpoint is removed once the run completes. Values that cannot be parsed
+are left as they are and counted as skipped.
+"""
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from cleaning import clean_coords
+from geo import LOCATION_FIELD, location_point
+from mongodb import bump_dataset_version, get_sync_database
+from rollup import mark_rollup_version, rollup_is_current
+
+TO_REPAIR = {"$or": [
+    {"LATITUDE": {"$type": "string"}},
+    {"LONGITUDE": {"$type": "string"}},
+    {LOCATION_FIELD: {"$exists": False}},
+]}
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return ObjectId(json.load(f)["last_id"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_checkpoint(path, last_id, stats):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"last_id": str(last_id), **stats}, f)
+    os.replace(tmp, path)
+
+
+def repair_chunk(collection, docs):
+    """Clean one chunk and write it back; returns (modified, skipped)."""
+    df = pd.DataFrame(docs, columns=["_id", "LATITUDE", "LONGITUDE"])
+    lat = clean_coords(df["LATITUDE"])
+    lon = clean_coords(df["LONGITUDE"])
+    valid = lat.between(-90, 90) & lon.between(-180, 180)
+
+    ops = [
+        UpdateOne({"_id": _id}, {"$set": {"LATITUDE": la, "LONGITUDE": lo, LOCATION_FIELD: location_point(la, lo)}})
+        for _id, la, lo in zip(df["_id"][valid], lat[valid], lon[valid])
+    ]
+    modified = collection.bulk_write(ops, ordered=False).modified_count if ops else 0
+    return modified, int((~valid).sum())
+
+
+def repair(chunk_size=5000, checkpoint_path=".repair_coords.checkpoint", reset=False):
+    db = get_sync_database()
+    collection = db["thefts"]
+
+    last_id = None if reset else load_checkpoint(checkpoint_path)
+    selector = TO_REPAIR if last_id is None else {"$and": [TO_REPAIR, {"_id": {"$gt": last_id}}]}
+    if last_id is not None:
+        print(f"Resuming after _id {last_id}")
+
+    stats = {"scanned": 0, "modified": 0, "skipped": 0}
+    started = time.perf_counter()
+    cursor = collection.find(selector, {"LATITUDE": 1, "LONGITUDE": 1}).sort("_id", 1).batch_size(chunk_size)
+
+    def flush(docs):
+        modified, skipped = repair_chunk(collection, docs)
+        stats["scanned"] += len(docs)
+        stats["modified"] += modified
+        stats["skipped"] += skipped
+        save_checkpoint(checkpoint_path, docs[-1]["_id"], stats)
+        elapsed = time.perf_counter() - started
+        print(f"{stats['scanned']} scanned, {stats['modified']} repaired, {stats['skipped']} skipped "
+              f"({stats['scanned'] / elapsed:,.0f} docs/s)")
+
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    if stats["modified"]:
+        # Let running API workers drop their cached results. Coordinates are
+        # not rollup dimensions, so a current rollup stays current.
+        rollup_current = rollup_is_current(db)
+        version = bump_dataset_version(db)
+        if rollup_current:
+            mark_rollup_version(db, version)
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=5000, help="documents per bulk_write")
+    parser.add_argument("--checkpoint", default=".repair_coords.checkpoint", help="progress file used to resume")
+    parser.add_argument("--reset", action="store_true", help="ignore any saved checkpoint and start over")
+    args = parser.parse_args(argv)
+
+    stats = repair(chunk_size=args.chunk_size, checkpoint_path=args.checkpoint, reset=args.reset)
+    rate = stats["scanned"] / stats["seconds"] if stats["seconds"] else 0
+    print(f"✅ Repaired {stats['modified']} of {stats['scanned']} documents in {stats['seconds']}s "
+          f"({rate:,.0f} docs/s); {stats['skipped']} could not be converted.")
+
+
+if __name__ == "__main__":
+    main()
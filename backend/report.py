@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from mongodb import MAX_TIME_MS, get_thefts_collection
+
+REPORT_TITLE = "Bike Theft Analysis Report"
+INVALID_RANGE = (
+    "Invalid or missing date range; provide valid start_date and end_date (YYYY-MM-DD) "
+    "or ensure DATE column exists in DB."
+)
+
+
+class ReportError(Exception):
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _top(field_expr, skip_nulls=True):
+    stages = [{"$match": {"v": {"$ne": None}}}] if skip_nulls else []
+    return [
+        {"$project": {"v": field_expr}},
+        *stages,
+        {"$group": {"_id": "$v", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": 1}
+    ]
+
+
+def report_pipeline(match: dict):
+    """Every report figure from one indexed $match, projecting only what is used."""
+    return [
+        {"$match": match},
+        {"$project": {
+            "_id": 0,
+            "POLICE_STATION": 1,
+            "DATE": 1,
+            "time_slot": {"$ifNull": ["$Time_of_day", "$Time_of_Day"]},
+            "model": {"$ifNull": ["$MAKE", "$Make"]},
+        }},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "station": _top({"$ifNull": ["$POLICE_STATION", "Unknown"]}, skip_nulls=False),
+            "time_slot": _top("$time_slot"),
+            "model": _top("$model"),
+            "day": _top({"$dateToString": {"format": "%Y-%m-%d", "date": "$DATE"}}),
+        }},
+    ]
+
+
+def _parse_date(value: str):
+    try:
+        return datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+
+
+async def _date_bound(collection, match: dict, direction: int):
+    doc = await collection.find_one(
+        {**match, "DATE": {"$type": "date"}},
+        {"_id": 0, "DATE": 1},
+        sort=[("DATE", direction)],
+        max_time_ms=MAX_TIME_MS
+    )
+    return doc["DATE"] if doc else None
+
+
+async def generate_summary(police_station: Optional[str], start_date: Optional[str], end_date: Optional[str]):
+    collection = get_thefts_collection()
+    match = {}
+    if police_station:
+        match["POLICE_STATION"] = police_station.upper()
+
+    # A missing bound defaults to the first/last theft on record, read off the
+    # DATE index rather than by scanning.
+    start_dt = _parse_date(start_date) if start_date else await _date_bound(collection, match, 1)
+    end_dt = _parse_date(end_date) if end_date else await _date_bound(collection, match, -1)
+
+    if (start_date and start_dt is None) or (end_date and end_dt is None):
+        raise ReportError(INVALID_RANGE, 400)
+    if start_dt is None or end_dt is None:
+        # Nothing dated to default the range from.
+        if await collection.count_documents(match, limit=1):
+            raise ReportError(INVALID_RANGE, 400)
+        raise ReportError("No data found in DB.", 404)
+
+    start_day = datetime(start_dt.year, start_dt.month, start_dt.day)
+    end_day = datetime(end_dt.year, end_dt.month, end_dt.day)
+    if start_day > end_day:
+        start_day, end_day = end_day, start_day
+
+    match["DATE"] = {"$gte": start_day, "$lt": end_day + timedelta(days=1)}
+    cursor = await collection.aggregate(report_pipeline(match), maxTimeMS=MAX_TIME_MS)
+    facets = (await cursor.to_list())[0]
+
+    total_thefts = facets["total"][0]["count"] if facets["total"] else 0
+    if not total_thefts:
+        raise ReportError("No data found for the given date range.", 404)
+
+    def top(name):
+        rows = facets[name]
+        return rows[0]["_id"] if rows else "Unknown"
+
+    most_targeted_station = top("station")
+    most_common_time = top("time_slot")
+    most_stolen_model = top("model")
+    highest_theft_day = top("day")
+
+    num_days = (end_day - start_day).days + 1
+    avg_per_day = round(total_thefts / num_days, 2) if num_days > 0 else 0
+
+    start_str = start_day.strftime("%Y-%m-%d")
+    end_str = end_day.strftime("%Y-%m-%d")
+    summary_text = (
+        f"Between {start_str} and {end_str}, there were {total_thefts} bike thefts. "
+        f"The most targeted police station was {most_targeted_station}, "
+        f"with most thefts during {most_common_time} hours. "
+        f"The most stolen model was {most_stolen_model}. "
+        f"The busiest day was {highest_theft_day}."
+    )
+
+    return {
+        "Report_Title": REPORT_TITLE,
+        "Date_Range": f"{start_str} to {end_str}",
+        "Generated_On": datetime.now().strftime("%Y-%m-%d"),
+        "Total_Thefts": total_thefts,
+        "Average_Per_Day": avg_per_day,
+        "Most_Targeted_Station": most_targeted_station,
+        "Most_Common_Time": most_common_time,
+        "Most_Stolen_Model": most_stolen_model,
+        "Highest_Theft_Day": highest_theft_day,
+        "Summary": summary_text
+    }
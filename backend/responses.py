@@ -0,0 +1,38 @@
+from datetime import datetime
+
+import orjson
+from fastapi.responses import JSONResponse
+
+# NaN/inf become null and datetimes ISO strings inside orjson itself, so
+# payloads need no per-value scrubbing before they are encoded.
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+# DATE is stored as a datetime but served as it was loaded, YYYY-MM-DD: the
+# Reports page compares it with a date input and the PDF column is sized
+# for it.
+RECORD_DATE_FORMAT = "%Y-%m-%d"
+
+
+def theft_record(doc: dict) -> dict:
+    """A theft document as the record endpoints return it (in place)."""
+    date = doc.get("DATE")
+    if isinstance(date, datetime):
+        doc["DATE"] = date.strftime(RECORD_DATE_FORMAT)
+    return doc
+
+
+def _default(value):
+    # ObjectId, Decimal128 and anything else orjson does not know.
+    return str(value)
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: orjson instead of the stdlib encoder."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,270 @@
+"""Pre-aggregated theft counts in a few narrow cubes.
+
+Usage (from backend/):
+    python rollup.py rebuild
+    python rollup.py check [--json]
+
+Each cube (CUBES) is a collection holding the number of thefts per
+combination of a few dimensions: the day with one commonly co-filtered
+dimension, plus one cube without the day over the dimensions the dashboard
+groups by. Keeping each cube narrow is what keeps it small; grouping on every
+filter dimension and the day gives about one row per theft. Dimension fields
+keep their names from the thefts collection, so a build_filter_query result
+applies to a cube once its DATE range is renamed to "day" (rollup_query).
+
+A query is answered from the smallest cube that has every field it filters
+and groups on (choose_cube); anything else goes to the raw collection.
+
+The cubes record the dataset version they reflect. The API reads from them
+only while that matches the current dataset version and falls back to the
+raw collection otherwise. Ingest paths that update them incrementally (see
+apply_rollup_deltas) move both versions forward together.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+from cache import result_cache
+from mongodb import DATASET_VERSION_ID, get_meta_collection, get_sync_database
+
+ROLLUP_COLLECTION = "theft_rollup"
+ROLLUP_META_ID = "rollup"
+EMPTY_ROWS = {"count": {"$lte": 0}}
+
+# Cube name -> dimensions, in the order tried by choose_cube (smallest
+# first). The dimensions are also the cube's unique index, so the equality
+# and $in filters come first and "day" last.
+CUBES = {
+    "day": ("day",),
+    "totals": ("POLICE_STATION", "Make", "MAKE", "Category", "Time_of_day"),
+    "time_day": ("Time_of_day", "day"),
+    "station_day": ("POLICE_STATION", "day"),
+    "make_day": ("Make", "MAKE", "day"),
+}
+
+USE_ROLLUP = os.getenv("ANALYTICS_USE_ROLLUP", "1") == "1"
+# How often the API re-checks whether the rollup is current.
+ROLLUP_POLL_SECONDS = float(os.getenv("ROLLUP_POLL_SECONDS", "5"))
+
+
+def cube_collection(cube: str) -> str:
+    return f"{ROLLUP_COLLECTION}_{cube}"
+
+
+def cube_indexes(cube: str):
+    return [IndexModel([(dim, ASCENDING) for dim in CUBES[cube]], name="key", unique=True)]
+
+
+def choose_cube(query: dict, group_fields=()):
+    """The smallest cube that can answer query grouped on group_fields, or
+    None when only the raw collection can."""
+    fields = {"day" if field == "DATE" else field for field in query} | set(group_fields)
+    return next((cube for cube, dims in CUBES.items() if fields <= set(dims)), None)
+
+
+def _day_expr():
+    # Only BSON dates get a day, as in rollup_key; text DATEs are never
+    # matched by the raw DATE range either.
+    return {"$cond": [
+        {"$eq": [{"$type": "$DATE"}, "date"]},
+        {"$dateTrunc": {"date": "$DATE", "unit": "day"}},
+        None,
+    ]}
+
+
+def rebuild_pipeline(cube: str, target: str):
+    # Every dimension is always present (null when missing), so a cube row
+    # can be found again from a raw document; see rollup_key.
+    key = {dim: _day_expr() if dim == "day" else {"$ifNull": [f"${dim}", None]} for dim in CUBES[cube]}
+    return [
+        {"$group": {"_id": key, "count": {"$sum": 1}}},
+        {"$replaceWith": {"$mergeObjects": ["$_id", {"count": "$count"}]}},
+        {"$out": target},
+    ]
+
+
+def rollup_query(query: dict) -> dict:
+    """A build_filter_query result for a cube: its DATE range becomes a
+    range on "day", which is exact because the bounds are whole days."""
+    if "DATE" not in query:
+        return query
+    query = dict(query)
+    query["day"] = query.pop("DATE")
+    return query
+
+
+def rollup_key(doc: dict, cube: str) -> dict:
+    """The row of cube a raw theft document counts towards."""
+    date = doc.get("DATE")
+    day = datetime(date.year, date.month, date.day) if isinstance(date, datetime) else None
+    return {dim: day if dim == "day" else doc.get(dim) for dim in CUBES[cube]}
+
+
+def rollup_delta_ops(docs, removed=()):
+    """{cube: [UpdateOne]} adding docs to every cube and taking removed off.
+
+    A document replaced by one with the same key nets out to no write.
+    """
+    ops = {}
+    for cube in CUBES:
+        counts = Counter()
+        keys = {}
+        for doc, delta in [(d, 1) for d in docs] + [(d, -1) for d in removed]:
+            key = rollup_key(doc, cube)
+            frozen = tuple(key.items())
+            counts[frozen] += delta
+            keys[frozen] = key
+        ops[cube] = [UpdateOne(keys[k], {"$inc": {"count": n}}, upsert=True) for k, n in counts.items() if n]
+    return ops
+
+
+def apply_rollup_deltas(db, docs, removed=()):
+    """Write rollup_delta_ops to the cubes, dropping rows left at zero so
+    they do not show up as zero-count groups."""
+    for cube, ops in rollup_delta_ops(docs, removed).items():
+        if ops:
+            db[cube_collection(cube)].bulk_write(ops, ordered=False)
+        if removed:
+            db[cube_collection(cube)].delete_many(EMPTY_ROWS)
+
+
+def mark_rollup_version(db, version):
+    db["meta"].update_one(
+        {"_id": ROLLUP_META_ID},
+        {"$set": {"dataset_version": version, "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def rollup_is_current(db) -> bool:
+    meta = db["meta"].find_one({"_id": ROLLUP_META_ID}) or {}
+    dataset = db["meta"].find_one({"_id": DATASET_VERSION_ID}) or {}
+    return "dataset_version" in meta and meta["dataset_version"] == dataset.get("version", 0)
+
+
+def rebuild(db=None):
+    """Recompute every cube from the raw collection, swapping each in atomically."""
+    db = db if db is not None else get_sync_database()
+    started = time.perf_counter()
+    version = (db["meta"].find_one({"_id": DATASET_VERSION_ID}) or {}).get("version", 0)
+
+    raw_rows = db["thefts"].estimated_document_count()
+    cubes = {}
+    for cube in CUBES:
+        staging = f"{cube_collection(cube)}_build"
+        db["thefts"].aggregate(rebuild_pipeline(cube, staging), allowDiskUse=True)
+        db[staging].create_indexes(cube_indexes(cube))
+        db[staging].rename(cube_collection(cube), dropTarget=True)
+        rows = db[cube_collection(cube)].estimated_document_count()
+        cubes[cube] = {"rows": rows, "ratio": round(rows / raw_rows, 4) if raw_rows else None}
+    # The single wide rollup of earlier versions.
+    db.drop_collection(ROLLUP_COLLECTION)
+    # If the data changed during the build this records the older version,
+    # leaving the rollup marked stale until the next rebuild.
+    mark_rollup_version(db, version)
+
+    rows = sum(cube["rows"] for cube in cubes.values())
+    return {"rows": rows,
+            "raw_rows": raw_rows,
+            "ratio": round(rows / raw_rows, 4) if raw_rows else None,
+            "cubes": cubes,
+            "dataset_version": version,
+            "seconds": round(time.perf_counter() - started, 2)}
+
+
+class RollupState:
+    """Answers "may the API read from the rollup right now?".
+
+    The rollup's version is compared with the dataset version the result
+    cache is using, so results cached for a version are always computed
+    from data of that version.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._checked_at = float("-inf")
+
+    async def is_current(self) -> bool:
+        if not USE_ROLLUP:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at >= ROLLUP_POLL_SECONDS:
+            doc = await get_meta_collection().find_one({"_id": ROLLUP_META_ID}) or {}
+            self._version = doc.get("dataset_version")
+            self._checked_at = now
+        return self._version is not None and self._version == await result_cache.dataset_version()
+
+    def invalidate(self):
+        self._checked_at = float("-inf")
+
+
+rollup_state = RollupState()
+
+
+def _group_counts(collection, query, stages, weight):
+    # Drop $sort/$limit so the check compares complete groupings, not
+    # tie-dependent top-N picks.
+    stages = [s for s in stages if "$limit" not in s and "$sort" not in s]
+    rows = collection.aggregate([{"$match": query}, *weight(stages)])
+    return {json.dumps(r.get("_id"), sort_keys=True, default=str): r["count"] for r in rows}
+
+
+def check(db=None):
+    """Compare every dashboard facet answered from a cube against the raw
+    collection."""
+    from analytics import FACET_FIELDS, FACETS, rollup_stages
+    from profile_queries import representative_filters
+
+    db = db if db is not None else get_sync_database()
+    mismatches = []
+    for shape, query in representative_filters(db["thefts"]).items():
+        for name, stages in FACETS.items():
+            cube = choose_cube(query, FACET_FIELDS[name])
+            if cube is None:
+                continue
+            raw = _group_counts(db["thefts"], query, stages, lambda s: s)
+            rolled = _group_counts(db[cube_collection(cube)], rollup_query(query), stages, rollup_stages)
+            if raw != rolled:
+                diff = {k: (raw.get(k), rolled.get(k)) for k in set(raw) | set(rolled) if raw.get(k) != rolled.get(k)}
+                mismatches.append({"facet": name, "cube": cube, "filter": shape, "diff": diff})
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--json", action="store_true", help="print check results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        stats = rebuild()
+        print(f"✅ Rollup rebuilt: {stats['rows']} rows for {stats['raw_rows']} thefts "
+              f"(ratio {stats['ratio']}) at dataset version {stats['dataset_version']} in {stats['seconds']}s")
+        # A request reads one cube, so each cube's own ratio is what it saves.
+        for cube, info in stats["cubes"].items():
+            print(f"   {cube} ({', '.join(CUBES[cube])}): {info['rows']} rows, ratio {info['ratio']}")
+        return 0
+
+    db = get_sync_database()
+    if not rollup_is_current(db):
+        print("⚠ Rollup is older than the current dataset version; run `python rollup.py rebuild`.")
+    mismatches = check(db)
+    if args.json:
+        print(json.dumps(mismatches, indent=2, default=str))
+    elif mismatches:
+        for m in mismatches:
+            print(f"✗ {m['facet']} [{m['filter']}, {m['cube']}]: {len(m['diff'])} group(s) differ, "
+                  f"e.g. {next(iter(m['diff'].items()))}")
+    else:
+        print("✅ Rollup matches the raw collection for every facet and filter shape.")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
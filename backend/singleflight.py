@@ -0,0 +1,58 @@
+"""Single-flight coalescing of identical concurrent computations.
+
+When several requests need the same result at once (same route, same
+canonical filters), the first one starts the computation and the others
+await it instead of running their own aggregation or render. Results are not
+kept once the computation finishes; that is the result cache's job. This
+only covers the gap while the first request is still computing, which is
+exactly when a burst of identical requests would otherwise all miss the
+cache.
+"""
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable
+
+from metrics import COALESCED_REQUESTS, COALESCING_LEADERS
+
+
+def _consume_exception(task):
+    # Every caller may have gone away; don't leave the error unretrieved.
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._in_flight = {}
+        self.leaders = Counter()
+        self.coalesced = Counter()
+
+    async def do(self, route: str, key: str, compute: Callable[[], Awaitable[Any]]):
+        """Result of compute(), shared with any concurrent call with the same key."""
+        task = self._in_flight.get(key)
+        if task is None:
+            self.leaders[route] += 1
+            COALESCING_LEADERS.labels(route).inc()
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(_consume_exception)
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced[route] += 1
+            COALESCED_REQUESTS.labels(route).inc()
+        # A caller that disconnects must not cancel the work others wait on.
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    def stats(self):
+        return {
+            "in_flight": len(self._in_flight),
+            "leaders": dict(self.leaders),
+            "coalesced": dict(self.coalesced),
+        }
+
+
+single_flight = SingleFlight()
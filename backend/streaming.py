@@ -0,0 +1,40 @@
+import csv
+import io
+
+from responses import dumps
+
+
+async def _batches(cursor, batch_size, transform=None):
+    batch = []
+    try:
+        async for doc in cursor:
+            batch.append(transform(doc) if transform else doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        # Release the server-side cursor if the client disconnects mid-stream.
+        await cursor.close()
+
+
+async def ndjson_stream(cursor, batch_size: int, transform=None):
+    """One JSON document per line, flushed every batch_size documents;
+    transform, if given, is applied to each document first."""
+    async for batch in _batches(cursor, batch_size, transform):
+        yield b"".join(dumps(doc) + b"\n" for doc in batch)
+
+
+async def csv_stream(cursor, fields, batch_size: int, transform=None):
+    """CSV with a header row; missing fields are written as empty cells."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    async for batch in _batches(cursor, batch_size, transform):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
@@ -1,25 +1,63 @@
-from fastapi import APIRouter, Query, HTTPException
-from collections import Counter
-from mongodb import thefts_collection 
-import folium
-from folium.plugins import HeatMap
+from fastapi import APIRouter, Body, Depends, Header, Query, HTTPException, Request, Response
+from functools import partial
+from fastapi.concurrency import run_in_threadpool
+from mongodb import MAX_RESULT_ROWS, MAX_TIME_MS, get_thefts_collection
+from admission import RETRY_AFTER_SECONDS
+from analytics import run_facets, facet_view
+from cache import canonical_key, result_cache
+from columnar import columnar_engine
+from geo import LOCATION_FIELD, bbox_condition, near_condition
+from heatmap import (
+    DEFAULT_CELL, HEATMAP_MAX_AGE, HEATMAP_MAX_AGE_IN_MEMORY, etag_matches, heatmap_grid,
+    load_page_from_disk, page_cache, page_etag, render_heatmap, save_page_to_disk
+)
+from jobs import DONE, FAILED, JobQueueFull, cases_digest, job_manager, run_pdf, run_report
+from pdf_export import preload as preload_pdf, render_cases_pdf
+from responses import FastJSONResponse, theft_record
+from rollup import rollup_state
+from report import ReportError, generate_summary
+from singleflight import single_flight
+from streaming import csv_stream, ndjson_stream
+from trends import theft_trends
+from workers import prewarm_process_pool, run_in_process
+from bson import ObjectId
+from pymongo.errors import ExecutionTimeout
 from fastapi.responses import HTMLResponse  
-from typing import Optional, List
-from datetime import datetime
-import math
-from fastapi.responses import JSONResponse
-import pandas as pd
+from typing import Optional, List, Union
+from datetime import date, datetime, timedelta
+import re
 import traceback
-from fpdf import FPDF
-from fastapi.responses import FileResponse
 from fastapi.responses import StreamingResponse
-import io
 
 router = APIRouter()
 
+THEFT_DATA_PROJECTION = {
+    "_id": 0,
+    "Make": 1,
+    "MAKE": 1,
+    "Category": 1,
+    "PLACE": 1,
+    "POLICE_STATION": 1,
+    "Time_of_day": 1,
+    "DAY": 1,
+    "LATITUDE": 1,
+    "LONGITUDE": 1,
+    "DATE": 1,
+    "STATUS": 1,
+    "CaseNo": 1,
+}
+
+
+def _day(value):
+    """Midnight of a date given as date, datetime or "YYYY-MM-DD"."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    return datetime(value.year, value.month, value.day)
+
+
 def build_filter_query(
-    date_from: Optional[str] = None,
-    date_to: Optional[str] = None,
+    date_from: Optional[Union[str, date]] = None,
+    date_to: Optional[Union[str, date]] = None,
     localities: Optional[List[str]] = None,
     places: Optional[List[str]] = None,
     company: Optional[str] = None,
@@ -30,7 +68,16 @@ def build_filter_query(
 ):
    
     query = {}
-  
+
+    # Whole days, inclusive on both ends, as a range on the DATE index.
+    if date_from or date_to:
+        date_range = {}
+        if date_from:
+            date_range["$gte"] = _day(date_from)
+        if date_to:
+            date_range["$lt"] = _day(date_to) + timedelta(days=1)
+        query["DATE"] = date_range
+
     if localities and len(localities) > 0:
         query["POLICE_STATION"] = {"$in": localities}
      
@@ -56,8 +103,11 @@ def build_filter_query(
     
     return query
 
-@router.get("/total-thefts")
-def get_total_thefts(
+
+def filter_params(
+    request: Request,
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
     localities: Optional[str] = Query(None),
     places: Optional[str] = Query(None),
     company: Optional[str] = Query(None),
@@ -66,7 +116,12 @@ def get_total_thefts(
     days: Optional[str] = Query(None),
     spot_types: Optional[str] = Query(None)
 ):
+    """Shared query-string filters, parsed once into a Mongo filter."""
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
     query = build_filter_query(
+        date_from=date_from,
+        date_to=date_to,
         localities=localities.split(",") if localities else None,
         places=places.split(",") if places else None,
         company=company,
@@ -75,484 +130,430 @@ def get_total_thefts(
         days=days.split(",") if days else None,
         spot_types=spot_types.split(",") if spot_types else None
     )
-    total = thefts_collection.count_documents(query)
-    return {"total_thefts": total}
+    # For the slow-request log in metrics.py.
+    request.state.filter_query = query
+    return query
 
 
-@router.get("/higest-police-station")
-def highest_police_station(
-    localities: Optional[str] = Query(None),
-    places: Optional[str] = Query(None),
-    company: Optional[str] = Query(None),
-    categories: Optional[str] = Query(None),
-    time_of_day: Optional[str] = Query(None),
-    days: Optional[str] = Query(None),
-    spot_types: Optional[str] = Query(None)
+def viewport_params(
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lon: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lon: Optional[float] = Query(None, ge=-180, le=180)
 ):
-    query = build_filter_query(
-        localities=localities.split(",") if localities else None,
-        places=places.split(",") if places else None,
-        company=company,
-        categories=categories.split(",") if categories else None,
-        time_of_day=time_of_day,
-        days=days.split(",") if days else None,
-        spot_types=spot_types.split(",") if spot_types else None
-    )
-    
-    pipeline = [
-        {"$match": query},
-        {"$group": {"_id": "$POLICE_STATION", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 1}
-    ]
-    
-    result = thefts_collection.aggregate(pipeline)
-    stations = list(result)
-    
-    if stations:
-        station = stations[0]
-        return {"station": station["_id"], "thefts": station["count"]}
-    else:
-        return {"station": "N/A", "thefts": 0}
+    """Optional map viewport as a $geoWithin condition on location (None when
+    no bounds are given)."""
+    bounds = (min_lat, min_lon, max_lat, max_lon)
+    if all(b is None for b in bounds):
+        return None
+    if any(b is None for b in bounds):
+        raise HTTPException(status_code=400, detail="min_lat, min_lon, max_lat and max_lon must be given together")
+    if min_lat >= max_lat or min_lon >= max_lon:
+        raise HTTPException(status_code=400, detail="Viewport minimums must be below its maximums")
+    return bbox_condition(min_lat, min_lon, max_lat, max_lon)
+
+
+def _after_id(query: dict, after: Optional[str]):
+    """query restricted to _ids after a next_cursor value."""
+    if after is None:
+        return query
+    if not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Invalid 'after' cursor")
+    return {**query, "_id": {"$gt": ObjectId(after)}}
+
+
+@router.get("/dashboard")
+async def dashboard(
+    query: dict = Depends(filter_params),
+    facets: Optional[str] = Query(None),
+    profile: bool = Query(False)
+):
+    try:
+        return await run_facets(query, facets.split(",") if facets else None, profile=profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/most-model")
-def get_most_model(
-    localities: Optional[str] = Query(None),
-    places: Optional[str] = Query(None),
-    company: Optional[str] = Query(None),
-    categories: Optional[str] = Query(None),
-    time_of_day: Optional[str] = Query(None),
-    days: Optional[str] = Query(None),
-    spot_types: Optional[str] = Query(None)
-):
-    query = build_filter_query(
-        localities=localities.split(",") if localities else None,
-        places=places.split(",") if places else None,
-        company=company,
-        categories=categories.split(",") if categories else None,
-        time_of_day=time_of_day,
-        days=days.split(",") if days else None,
-        spot_types=spot_types.split(",") if spot_types else None
-    )
-    
-    pipeline = [
-        {"$match": query},
-        {"$group": {"_id": "$MAKE", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 5}
-    ]
-    
-    result = list(thefts_collection.aggregate(pipeline))
-    data = [{"model": r["_id"], "count": r["count"]} for r in result]
-    return {"data": data}
+@router.get("/cache/stats")
+async def cache_stats():
+    return {
+        **result_cache.stats(),
+        "columnar": columnar_engine.stats(),
+        "single_flight": single_flight.stats(),
+        "jobs": job_manager.stats(),
+    }
 
 
-def safe_number(value):
-    """Convert None, NaN, inf, or invalid numbers to 0."""
-    try:
-        if value is None:
-            return 0.0
-        # handle floats safely with isnan/isinf
-        if isinstance(value, float):
-            if math.isnan(value) or math.isinf(value):
-                return 0.0
-            return float(value)
-        # ints are safe to convert
-        if isinstance(value, int):
-            return float(value)
-        # try to coerce other types
-        return float(value)
-    except Exception:
-        return 0.0
+@router.get("/total-thefts")
+async def get_total_thefts(query: dict = Depends(filter_params)):
+    return await facet_view("total_thefts", query)
+
+
+@router.get("/higest-police-station")
+async def highest_police_station(query: dict = Depends(filter_params)):
+    return await facet_view("highest_police_station", query)
+
+
+@router.get("/most-model")
+async def get_most_model(query: dict = Depends(filter_params)):
+    return await facet_view("most_model", query)
 
 
 @router.get("/peak-time")
-def get_time(
-    localities: Optional[str] = Query(None),
-    places: Optional[str] = Query(None),
-    company: Optional[str] = Query(None),
-    categories: Optional[str] = Query(None),
-    time_of_day: Optional[str] = Query(None),
-    days: Optional[str] = Query(None),
-    spot_types: Optional[str] = Query(None)
-):
-    query = build_filter_query(
-        localities=localities.split(",") if localities else None,
-        places=places.split(",") if places else None,
-        company=company,
-        categories=categories.split(",") if categories else None,
-        time_of_day=time_of_day,
-        days=days.split(",") if days else None,
-        spot_types=spot_types.split(",") if spot_types else None
-    )
-    
-    pipeline = [
-        {"$match": query},
-        {"$group": {"_id": "$Time_of_day", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 1}
-    ]
-    
-    result = list(thefts_collection.aggregate(pipeline))
-    if result:
-        slot = result[0]
-        return {"time_slot": slot.get("_id"), "time": slot.get("count", 0)}
-    return {"time_slot": None, "time": 0}
+async def get_time(query: dict = Depends(filter_params)):
+    return await facet_view("peak_time", query)
 
 
 @router.get("/thefts-by-ps")
-def get_thefts_by_locality(
-    localities: Optional[str] = Query(None),
-    places: Optional[str] = Query(None),
-    company: Optional[str] = Query(None),
-    categories: Optional[str] = Query(None),
-    time_of_day: Optional[str] = Query(None),
-    days: Optional[str] = Query(None),
-    spot_types: Optional[str] = Query(None)
-):
-    query = build_filter_query(
-        localities=localities.split(",") if localities else None,
-        places=places.split(",") if places else None,
-        company=company,
-        categories=categories.split(",") if categories else None,
-        time_of_day=time_of_day,
-        days=days.split(",") if days else None,
-        spot_types=spot_types.split(",") if spot_types else None
-    )
-    pipeline = [
-        {"$match": query},
-        {"$group": {
-            "_id": {"$ifNull": ["$POLICE_STATION", "Unknown"]},
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"count": -1}}
-    ]
- 
-    result = thefts_collection.aggregate(pipeline)
-    data = [{"locality": r["_id"], "count": r["count"]} for r in result]
-    return {"data": data}
+async def get_thefts_by_locality(query: dict = Depends(filter_params)):
+    return await facet_view("thefts_by_ps", query)
 
 
 @router.get("/Time_slot-by-company")
-def time_slot_by_company(
-    localities: Optional[str] = Query(None),
-    places: Optional[str] = Query(None),
-    company: Optional[str] = Query(None),
-    categories: Optional[str] = Query(None),
-    time_of_day: Optional[str] = Query(None),
-    days: Optional[str] = Query(None),
-    spot_types: Optional[str] = Query(None)
-):
-    query = build_filter_query(
-        localities=localities.split(",") if localities else None,
-        places=places.split(",") if places else None,
-        company=company,
-        categories=categories.split(",") if categories else None,
-        time_of_day=time_of_day,
-        days=days.split(",") if days else None,
-        spot_types=spot_types.split(",") if spot_types else None
-    )
-    
-    pipeline = [
-        {"$match": query},
-        {"$group": {
-            "_id": {"company": "$MAKE", "Time_slot": "$Time_of_day"},
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"_id.company": 1}}
-    ]
-    
-    result = thefts_collection.aggregate(pipeline)
-    
-    data = {}
-    for r in result:
-        company_name = r["_id"].get("company", "Unknown")
-        period = r["_id"].get("Time_slot", "Unknown")
-        count = safe_number(r.get("count", 0))
-        
-        if company_name not in data:
-            data[company_name] = {
-                "Morning": 0,
-                "Afternoon": 0,
-                "Evening": 0,
-                "Midnight": 0
-            }
-        
-        if period in data[company_name]:
-            data[company_name][period] = count
-    
-    output = []
-    for k, v in data.items():
-        clean_v = {slot: safe_number(vv) for slot, vv in v.items()}
-        output.append({"company": k, **clean_v})
-    
-    for o in output:
-        for key in o:
-            if isinstance(o[key], float) and math.isnan(o[key]):
-                o[key] = 0.0
-    
-    return JSONResponse(content={"data": output})
-  
-  
+async def time_slot_by_company(query: dict = Depends(filter_params)):
+    return await facet_view("time_slot_by_company", query)
+
+
 @router.get("/thefts-company")
-def get_company(
-    localities: Optional[str] = Query(None),
-    places: Optional[str] = Query(None),
-    company: Optional[str] = Query(None),
-    categories: Optional[str] = Query(None),
-    time_of_day: Optional[str] = Query(None),
-    days: Optional[str] = Query(None),
-    spot_types: Optional[str] = Query(None)
+async def get_company(query: dict = Depends(filter_params)):
+    return await facet_view("thefts_company", query)
+
+
+@router.get("/theft-trends")
+async def get_theft_trends(
+    query: dict = Depends(filter_params),
+    interval: str = Query("month", pattern="^(day|week|month)$")
 ):
-    query = build_filter_query(
-        localities=localities.split(",") if localities else None,
-        places=places.split(",") if places else None,
-        company=company,
-        categories=categories.split(",") if categories else None,
-        time_of_day=time_of_day,
-        days=days.split(",") if days else None,
-        spot_types=spot_types.split(",") if spot_types else None
-    )
-    
-    pipeline = [
-        {"$match": query},
-        {"$group": {"_id": "$Make", "count": {"$sum": 1}}},
-        {"$sort": {"_id": 1}}
-    ]
-    
-    result = thefts_collection.aggregate(pipeline)
-    data = [{"company": r["_id"], "count": r["count"]} for r in result]
-    
-    return {"data": data}
+    """{"data": [{"name": bucket label, "thefts": count}, ...]} oldest first."""
+    return await theft_trends(query, interval)
 
 
 @router.get("/theft-data")
-def theft_data(
-    localities: Optional[str] = Query(None),
-    places: Optional[str] = Query(None),
-    company: Optional[str] = Query(None),
-    categories: Optional[str] = Query(None),
-    time_of_day: Optional[str] = Query(None),
-    days: Optional[str] = Query(None),
-    spot_types: Optional[str] = Query(None)
+async def theft_data(
+    query: dict = Depends(filter_params),
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+    batch_size: int = Query(1000, ge=1, le=10000),
+    after: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=10000)
 ):
-    query = build_filter_query(
-        localities=localities.split(",") if localities else None,
-        places=places.split(",") if places else None,
-        company=company,
-        categories=categories.split(",") if categories else None,
-        time_of_day=time_of_day,
-        days=days.split(",") if days else None,
-        spot_types=spot_types.split(",") if spot_types else None
+    """Filtered theft records.
+
+    format=json (default) returns {"data": [...]}. format=ndjson and
+    format=csv stream the cursor in batch_size chunks instead of building the
+    whole result in memory. Passing limit (and after=<next_cursor> for later
+    pages) switches to keyset pagination on _id.
+    """
+    paged = limit is not None or after is not None
+    if paged:
+        query = _after_id(query, after)
+        limit = limit or batch_size
+
+    if format != "json" or paged:
+        projection = {**THEFT_DATA_PROJECTION, "_id": 1} if paged else THEFT_DATA_PROJECTION
+        cursor = get_thefts_collection().find(
+            query, projection, batch_size=min(batch_size, limit or batch_size), max_time_ms=MAX_TIME_MS
+        )
+        if paged:
+            cursor = cursor.sort("_id", 1).limit(limit)
+
+        if format == "ndjson":
+            return StreamingResponse(
+                ndjson_stream(cursor, batch_size, theft_record), media_type="application/x-ndjson"
+            )
+        if format == "csv":
+            fields = [f for f in THEFT_DATA_PROJECTION if f != "_id"]
+            return StreamingResponse(
+                csv_stream(cursor, fields, batch_size, theft_record),
+                media_type="text/csv",
+                headers={"Content-Disposition": 'attachment; filename="theft_data.csv"'}
+            )
+
+        thefts = await cursor.to_list()
+        next_cursor = str(thefts[-1]["_id"]) if len(thefts) == limit else None
+        for t in thefts:
+            del t["_id"]
+            theft_record(t)
+        return FastJSONResponse({"data": thefts, "next_cursor": next_cursor})
+
+    async def load():
+        cursor = get_thefts_collection().find(query, THEFT_DATA_PROJECTION, max_time_ms=MAX_TIME_MS)
+        thefts = await cursor.limit(MAX_RESULT_ROWS + 1).to_list()
+        if len(thefts) > MAX_RESULT_ROWS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"More than {MAX_RESULT_ROWS} matching records; narrow the filters, "
+                       "page with limit/after or use format=ndjson or csv"
+            )
+        return [theft_record(t) for t in thefts]
+
+    # Not kept in the result cache: a list of up to MAX_RESULT_ROWS records
+    # per filter set would pin far more memory than the analytics results
+    # the cache is sized for. Identical concurrent exports still share one read.
+    key = f"{await result_cache.dataset_version()}:{canonical_key('theft_data', query)}"
+    thefts = await single_flight.do("theft_data", key, load)
+    # Returned as a response so the whole list skips jsonable_encoder.
+    return FastJSONResponse({"data": thefts})
+
+
+@router.get("/thefts-within")
+async def thefts_within(
+    query: dict = Depends(filter_params),
+    viewport: Optional[dict] = Depends(viewport_params),
+    limit: int = Query(1000, ge=1, le=10000),
+    after: Optional[str] = Query(None)
+):
+    """Filtered thefts inside a map viewport, read from the 2dsphere index and
+    paged by _id: {"data": [...], "next_cursor": ...}."""
+    if viewport is None:
+        raise HTTPException(status_code=400, detail="min_lat, min_lon, max_lat and max_lon are required")
+    query = _after_id({**query, LOCATION_FIELD: viewport}, after)
+    projection = {**THEFT_DATA_PROJECTION, "_id": 1}
+    cursor = get_thefts_collection().find(query, projection, max_time_ms=MAX_TIME_MS).sort("_id", 1).limit(limit)
+    thefts = await cursor.to_list()
+    next_cursor = str(thefts[-1]["_id"]) if len(thefts) == limit else None
+    for t in thefts:
+        del t["_id"]
+        theft_record(t)
+    return FastJSONResponse({"data": thefts, "next_cursor": next_cursor})
+
+
+@router.get("/thefts-near")
+async def thefts_near(
+    query: dict = Depends(filter_params),
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(1000, gt=0, le=50000),
+    limit: int = Query(100, ge=1, le=10000),
+    offset: int = Query(0, ge=0, le=100000)
+):
+    """Filtered thefts within radius_m metres of (lat, lon), nearest first:
+    {"data": [...], "next_offset": ...}. Results are ordered by distance, so
+    pages are by offset rather than _id."""
+    query = {**query, LOCATION_FIELD: near_condition(lat, lon, radius_m)}
+    cursor = get_thefts_collection().find(query, THEFT_DATA_PROJECTION, max_time_ms=MAX_TIME_MS)
+    thefts = [theft_record(t) for t in await cursor.skip(offset).limit(limit).to_list()]
+    next_offset = offset + limit if len(thefts) == limit else None
+    return FastJSONResponse({"data": thefts, "next_offset": next_offset})
+
+
+async def _heatmap_grid(query, cell):
+    return await result_cache.get_or_compute(
+        "heatmap_grid", query, lambda: heatmap_grid(query, cell), extra=cell
     )
-    
-    thefts = list(thefts_collection.find(
-        query,
-        {
-            "_id": 0,
-            "Make": 1,
-            "MAKE": 1,
-            "Category": 1,
-            "PLACE": 1,
-            "POLICE_STATION": 1,
-            "Time_of_day": 1,
-            "DAY": 1,
-            "LATITUDE": 1,
-            "LONGITUDE": 1,
-            "DATE": 1,
-            "STATUS": 1,
-            "CaseNo": 1,
-        }
- ))
-    
-    return {"data": thefts}
 
 
-@router.get("/thefts-heatmap", response_class=HTMLResponse)
-def thefts_heatmap(
-    localities: Optional[str] = Query(None),
-    places: Optional[str] = Query(None),
-    company: Optional[str] = Query(None),
-    categories: Optional[str] = Query(None),
-    time_of_day: Optional[str] = Query(None),
-    days: Optional[str] = Query(None),
-    spot_types: Optional[str] = Query(None)
+def case_no_condition(value: str, prefix: bool = False):
+    """CaseNo equality or prefix match in the form the partial unique index
+    (case_no_unique) can serve."""
+    if prefix:
+        return {"$regex": "^" + re.escape(value), "$type": "string"}
+    return {"$eq": value, "$type": "string"}
+
+
+# Declared before /cases/{case_no} so "search" is not taken for a case number.
+@router.get("/cases/search")
+async def search_cases(
+    query: dict = Depends(filter_params),
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
+    case_no_prefix: Optional[str] = Query(None, min_length=1, max_length=50),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0, le=10000)
 ):
-    query = build_filter_query(
-        localities=localities.split(",") if localities else None,
-        places=places.split(",") if places else None,
-        company=company,
-        categories=categories.split(",") if categories else None,
-        time_of_day=time_of_day,
-        days=days.split(",") if days else None,
-        spot_types=spot_types.split(",") if spot_types else None
+    """Cases whose CaseNo starts with case_no_prefix (case-sensitive) and/or
+    whose PLACE, Make, MAKE or POLICE_STATION contain the words in q, within
+    the usual filters: {"data": [...], "next_offset": ...}. Word matches come
+    best first, prefix-only matches in CaseNo order."""
+    if not q and not case_no_prefix:
+        raise HTTPException(status_code=400, detail="Give q and/or case_no_prefix")
+    query = dict(query)
+    if case_no_prefix:
+        query["CaseNo"] = case_no_condition(case_no_prefix, prefix=True)
+    if q:
+        query["$text"] = {"$search": q}
+        order = [("score", {"$meta": "textScore"})]
+    else:
+        order = [("CaseNo", 1)]
+    cursor = get_thefts_collection().find(query, THEFT_DATA_PROJECTION, max_time_ms=MAX_TIME_MS)
+    cases = [theft_record(c) for c in await cursor.sort(order).skip(offset).limit(limit).to_list()]
+    next_offset = offset + limit if len(cases) == limit else None
+    return FastJSONResponse({"data": cases, "next_offset": next_offset})
+
+
+@router.get("/cases/{case_no:path}")
+async def get_case(case_no: str):
+    """One case by its CaseNo (which may contain "/"), as a single index seek."""
+    case = await get_thefts_collection().find_one(
+        {"CaseNo": case_no_condition(case_no)}, THEFT_DATA_PROJECTION, max_time_ms=MAX_TIME_MS
     )
-    thefts = list(thefts_collection.find(query, {"_id": 0, "LATITUDE": 1, "LONGITUDE": 1}))
-    heat_data = []
-    
-    for t in thefts:
-        try:
-            lat = float(t.get("LATITUDE", "nan"))
-            lon = float(t.get("LONGITUDE", "nan"))
-            if math.isnan(lat) or math.isnan(lon):
-                continue
-            if -90 <= lat <= 90 and -180 <= lon <= 180:
-                heat_data.append([lat, lon])
-        except (TypeError, ValueError):
-            continue
-    
-    avg_lat, avg_lon = 16.5777, 74.3155
-    m = folium.Map(location=[avg_lat, avg_lon], zoom_start=9.3, tiles="OpenStreetMap")
-    
-    if heat_data:
-        HeatMap(heat_data, radius=8, blur=6, min_opacity=0.7).add_to(m)
-    
-    return HTMLResponse(content=m.get_root().render())
+    if case is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+    return FastJSONResponse(theft_record(case))
+
+
+@router.get("/thefts-heatmap/grid")
+async def thefts_heatmap_grid(
+    query: dict = Depends(filter_params),
+    viewport: Optional[dict] = Depends(viewport_params),
+    cell: float = Query(DEFAULT_CELL, gt=0, le=1)
+):
+    """Thefts binned server-side into a cell x cell degree grid.
+
+    "points" is a list of [lat, lon, weight] that HeatMap / Leaflet.heat
+    accept as-is. With a viewport (min_lat, min_lon, max_lat, max_lon) only
+    the thefts in view are read.
+    """
+    if viewport is not None:
+        query = {**query, LOCATION_FIELD: viewport}
+    return await _heatmap_grid(query, cell)
+
+
+@router.get("/thefts-heatmap", response_class=HTMLResponse)
+async def thefts_heatmap(
+    query: dict = Depends(filter_params),
+    cell: float = Query(DEFAULT_CELL, gt=0, le=1),
+    if_none_match: Optional[str] = Header(None)
+):
+    version = await result_cache.dataset_version()
+    etag = page_etag(query, cell, version)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={HEATMAP_MAX_AGE}, must-revalidate"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    found, html = page_cache.get(etag)
+    if not found:
+        html = await run_in_threadpool(load_page_from_disk, etag)
+    if html is None:
+        async def render():
+            grid = await _heatmap_grid(query, cell)
+            # Folium rendering is CPU-bound; keep it off the event loop.
+            page = await run_in_threadpool(render_heatmap, grid["points"])
+            page_cache.set(etag, page, HEATMAP_MAX_AGE_IN_MEMORY)
+            await run_in_threadpool(save_page_to_disk, etag, page)
+            return page
+
+        # The ETag already identifies filters, cell and version.
+        html = await single_flight.do("thefts_heatmap", etag, render)
+
+    return HTMLResponse(content=html, headers=headers)
 
  
 @router.post("/generate-report")
-def generate_report(
+async def generate_report(
     police_station: Optional[str] = Query(None),
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None)
 ):
     try:
-        query = {}
-        if police_station:
-            query["POLICE_STATION"] = police_station.upper()
-
-        data = list(thefts_collection.find(query, {"_id": 0}))
-        if not data:
-            return JSONResponse(content={"message": "No data found in DB."}, status_code=404)
-
-        df = pd.DataFrame(data)
-
-        # Parse DATE column safely into a new column DATE_PARSED
-        if "DATE" in df.columns:
-            df["DATE_PARSED"] = pd.to_datetime(df["DATE"].astype(str), errors="coerce", infer_datetime_format=True)
-        elif "Date" in df.columns:
-            df["DATE_PARSED"] = pd.to_datetime(df["Date"].astype(str), errors="coerce", infer_datetime_format=True)
-        else:
-            df["DATE_PARSED"] = pd.to_datetime(pd.Series([pd.NaT] * len(df)))
-
-        # Determine start/end timestamps
-        start_dt = pd.to_datetime(start_date, errors="coerce") if start_date else df["DATE_PARSED"].min()
-        end_dt = pd.to_datetime(end_date, errors="coerce") if end_date else df["DATE_PARSED"].max()
-
-        if pd.isna(start_dt) or pd.isna(end_dt):
-            return JSONResponse(
-                content={"message": "Invalid or missing date range; provide valid start_date and end_date (YYYY-MM-DD) or ensure DATE column exists in DB."},
-                status_code=400
-            )
-
-        if start_dt > end_dt:
-            start_dt, end_dt = end_dt, start_dt
-
-        # Filter by parsed dates
-        df = df[(df["DATE_PARSED"] >= start_dt) & (df["DATE_PARSED"] <= end_dt)]
-
-        if df.empty:
-            return JSONResponse(content={"message": "No data found for the given date range."}, status_code=404)
-
-        # Total thefts
-        total_thefts = int(len(df))
-
-        # Most targeted police station (safe)
-        if "POLICE_STATION" in df.columns:
-            station_series = df["POLICE_STATION"].fillna("Unknown").astype(str)
-            most_targeted_station = station_series.value_counts().idxmax() if not station_series.value_counts().empty else "Unknown"
-        else:
-            most_targeted_station = "Unknown"
-
-        # Most common time slot (safe)
-        if "Time_of_day" in df.columns:
-            time_series = df["Time_of_day"].dropna().astype(str)
-        elif "Time_of_Day" in df.columns:
-            time_series = df["Time_of_Day"].dropna().astype(str)
-        else:
-            time_series = pd.Series(dtype=object)
-        most_common_time = time_series.value_counts().idxmax() if not time_series.empty else "Unknown"
-
-        # Most stolen model (safe)
-        if "MAKE" in df.columns:
-            make_series = df["MAKE"].dropna().astype(str)
-        elif "Make" in df.columns:
-            make_series = df["Make"].dropna().astype(str)
-        else:
-            make_series = pd.Series(dtype=object)
-        most_stolen_model = make_series.value_counts().idxmax() if not make_series.empty else "Unknown"
-
-        # Busiest day
-        date_notna = df["DATE_PARSED"].dropna()
-        highest_theft_day = date_notna.dt.strftime("%Y-%m-%d").value_counts().idxmax() if not date_notna.empty else "Unknown"
-
-        # Average per day
-        num_days = int((end_dt.normalize() - start_dt.normalize()).days) + 1
-        avg_per_day = round(total_thefts / num_days, 2) if num_days > 0 else 0
-
-        report_title = "Bike Theft Analysis Report"
-        date_range = f"{start_dt.strftime('%Y-%m-%d')} to {end_dt.strftime('%Y-%m-%d')}"
-        generated_on = datetime.now().strftime("%Y-%m-%d")
-
-        summary_text = (
-            f"Between {start_dt.strftime('%Y-%m-%d')} and {end_dt.strftime('%Y-%m-%d')}, there were {total_thefts} bike thefts. "
-            f"The most targeted police station was {most_targeted_station}, "
-            f"with most thefts during {most_common_time} hours. "
-            f"The most stolen model was {most_stolen_model}. "
-            f"The busiest day was {highest_theft_day}."
-        )
-
-        return JSONResponse(content={
-            "Report_Title": report_title,
-            "Date_Range": date_range,
-            "Generated_On": generated_on,
-            "Total_Thefts": total_thefts,
-            "Average_Per_Day": avg_per_day,
-            "Most_Targeted_Station": most_targeted_station,
-            "Most_Common_Time": most_common_time,
-            "Most_Stolen_Model": most_stolen_model,
-            "Highest_Theft_Day": highest_theft_day,
-            "Summary": summary_text
-        })
-
+        return await generate_summary(police_station, start_date, end_date)
+    except ReportError as e:
+        return FastJSONResponse(content={"message": e.message}, status_code=e.status_code)
+    except ExecutionTimeout:
+        # AdmissionMiddleware turns it into a 503 and counts it.
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
-from fastapi import Body
-from fastapi.responses import FileResponse
-from fpdf import FPDF
 
-@router.post("/download/pdf")
-def download_pdf(filtered_reports: list = Body(...)):
-    file_path = "filtered_reports.pdf"
-
-    pdf = FPDF()
-    pdf.add_page()
+@router.post("/thefts/batch")
+async def ingest_thefts_batch(
+    records: List[dict] = Body(...),
+    dayfirst: bool = Query(False),
+    date_format: Optional[str] = Query(None),
+    keep_invalid: bool = Query(False),
+    reject_bad_coords: bool = Query(False)
+):
+    """Upsert theft records on CaseNo and update the dashboard counters in
+    the same pass (see live_ingest.py). Returns inserted/updated/unchanged
+    counts, the rejected rows with their reasons and the rows stored despite
+    a problem (bad coordinates, kept with null coordinates)."""
+    # Imported on first use: it brings in pandas, which only writers need.
+    from live_ingest import MAX_BATCH_RECORDS, ingest_records
+
+    if len(records) > MAX_BATCH_RECORDS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_RECORDS} records per batch")
+    stats = await run_in_threadpool(
+        ingest_records, records, dayfirst=dayfirst, date_format=date_format, keep_invalid=keep_invalid,
+        reject_bad_coords=reject_bad_coords
+    )
+    if "dataset_version" in stats:
+        # This worker serves the new data right away; others within a poll.
+        result_cache.invalidate()
+        rollup_state.invalidate()
+    return FastJSONResponse(stats)
 
-    pdf.set_font("Arial", style="B", size=16)
-    pdf.cell(200, 10, txt="Filtered Bike Theft Reports", ln=True)
-    pdf.ln(5)
 
-    pdf.set_font("Arial", size=12)
+@router.post("/download/pdf")
+async def download_pdf(filtered_reports: list = Body(...)):
+    # Built in memory in a worker process: no shared file for concurrent
+    # downloads to race on and nothing left on disk.
+    pdf_bytes = await run_in_process(render_cases_pdf, filtered_reports)
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": 'attachment; filename="filtered_reports.pdf"'}
+    )
 
-    for report in filtered_reports:
-        pdf.cell(200, 10, txt=f"Case No: {report['CaseNo']}", ln=True)
-        pdf.cell(200, 10, txt=f"Make: {report['Make']}", ln=True)
-        pdf.cell(200, 10, txt=f"MAKE: {report['MAKE']}", ln=True)
-        pdf.cell(200, 10, txt=f"Police Station: {report['POLICE_STATION']}", ln=True)
-        pdf.cell(200, 10, txt=f"Date: {report['DATE']}", ln=True)
-        pdf.cell(200, 10, txt=f"Status: {report['STATUS']}", ln=True)
-        pdf.ln(5)
 
-    pdf.output(file_path)
+async def _submit_job(kind: str, params: dict, run):
+    try:
+        job, deduplicated = await job_manager.submit(kind, params, run)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    return {**job.view(), "deduplicated": deduplicated}
 
-    return FileResponse(
-        file_path,
-        media_type="application/pdf",
-        filename="filtered_reports.pdf"
-    )
 
+@router.post("/jobs/report", status_code=202)
+async def submit_report_job(
+    police_station: Optional[str] = Query(None),
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None)
+):
+    """Queue /generate-report as a job; poll /jobs/{job_id}, then fetch
+    /jobs/{job_id}/result."""
+    params = {"police_station": police_station, "start_date": start_date, "end_date": end_date}
+    return await _submit_job("report", params, partial(run_report, **params))
 
 
+@router.post("/jobs/pdf", status_code=202)
+async def submit_pdf_job(
+    query: dict = Depends(filter_params),
+    cases: Optional[list] = Body(None)
+):
+    """Queue a case PDF: of the posted case rows, like /download/pdf, or of
+    the cases matching the filters when no body is sent."""
+    if cases is not None:
+        params, run = {"cases": cases_digest(cases)}, partial(run_pdf, cases=cases)
+    else:
+        params, run = {"query": query}, partial(run_pdf, query=query)
+    return await _submit_job("pdf", params, run)
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.view()
+
+
+@router.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    if job.status == FAILED:
+        return FastJSONResponse(content={"message": job.error}, status_code=job.status_code)
+    artifact = job_manager.result(job_id) if job.status == DONE else None
+    if artifact is None:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    headers = {"Content-Disposition": f'attachment; filename="{artifact.filename}"'} if artifact.filename else None
+    return Response(content=artifact.content, media_type=artifact.media_type, headers=headers)
+
+
+async def prewarm():
+    """Fill the result cache for the unfiltered dashboard and heatmap grid and
+    start the PDF workers, so a fresh worker serves its first requests warm."""
+    await prewarm_process_pool(preload_pdf)
+    await run_facets({})
+    await _heatmap_grid({}, DEFAULT_CELL)
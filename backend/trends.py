@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+from cache import result_cache
+from mongodb import MAX_TIME_MS, get_database, get_thefts_collection
+from rollup import choose_cube, cube_collection, rollup_query, rollup_state
+
+INTERVALS = ("day", "week", "month")
+LABEL_FORMATS = {"day": "%Y-%m-%d", "week": "%Y-%m-%d", "month": "%Y-%m"}
+
+
+def bucket_start(dt: datetime, interval: str) -> datetime:
+    """Start of the bucket dt falls in; weeks start on Monday, as in trend_pipeline."""
+    day = datetime(dt.year, dt.month, dt.day)
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start: datetime, interval: str) -> datetime:
+    if interval == "day":
+        return start + timedelta(days=1)
+    if interval == "week":
+        return start + timedelta(weeks=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def _truncate(field: str, interval: str):
+    spec = {"date": field, "unit": interval}
+    if interval == "week":
+        spec["startOfWeek"] = "monday"
+    return {"$dateTrunc": spec}
+
+
+def trend_pipeline(query: dict, interval: str, date_cond: dict):
+    """Theft counts per bucket over the DATE index, for documents whose DATE
+    is a real datetime."""
+    date_match = {"DATE": date_cond}
+    return [
+        {"$match": {"$and": [query, date_match]} if query else date_match},
+        {"$group": {"_id": _truncate("$DATE", interval), "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+def rollup_trend_pipeline(query: dict, interval: str):
+    return [
+        {"$match": rollup_query(query)},
+        {"$match": {"day": {"$ne": None}}},
+        {"$group": {"_id": _truncate("$day", interval), "count": {"$sum": "$count"}}},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+async def _aggregate(collection, pipeline):
+    cursor = await collection.aggregate(pipeline, maxTimeMS=MAX_TIME_MS)
+    return [(row["_id"], row["count"]) for row in await cursor.to_list()]
+
+
+def _fill(buckets, interval):
+    """[{name, thefts}] from the first to the last bucket, gaps as 0."""
+    if not buckets:
+        return []
+    counts = dict(buckets)
+    series = []
+    current, last = min(counts), max(counts)
+    while current <= last:
+        series.append({"name": current.strftime(LABEL_FORMATS[interval]), "thefts": counts.get(current, 0)})
+        current = next_bucket(current, interval)
+    return series
+
+
+async def theft_trends(query: dict, interval: str = "month", now: datetime = None):
+    """Theft counts per day/week/month for the filtered data.
+
+    Closed buckets (everything before the bucket "now" is in) are cached
+    until the dataset version changes, so a request re-aggregates only the
+    open bucket. When the rollup is current and a cube covers the filters the
+    whole series comes from it.
+    """
+    cube = choose_cube(query, ("day",)) if await rollup_state.is_current() else None
+    if cube is not None:
+        buckets = await _aggregate(get_database()[cube_collection(cube)], rollup_trend_pipeline(query, interval))
+        return {"data": _fill(buckets, interval), "interval": interval, "source": "rollup"}
+
+    thefts = get_thefts_collection()
+    open_start = bucket_start(now or datetime.utcnow(), interval)
+
+    async def closed():
+        return await _aggregate(thefts, trend_pipeline(query, interval, {"$type": "date", "$lt": open_start}))
+
+    closed_buckets = await result_cache.get_or_compute(
+        "theft_trends_closed", query, closed, extra=f"{interval}:{open_start.isoformat()}"
+    )
+    open_buckets = await _aggregate(thefts, trend_pipeline(query, interval, {"$gte": open_start}))
+    return {"data": _fill(closed_buckets + open_buckets, interval), "interval": interval, "source": "raw"}
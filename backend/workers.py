@@ -0,0 +1,35 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# CPU-bound work (PDF rendering) runs in separate processes so it neither
+# holds the GIL nor blocks the event loop.
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool = None
+
+
+def get_process_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PROCESS_POOL_WORKERS)
+    return _pool
+
+
+async def run_in_process(fn, *args):
+    """Run fn(*args) in the shared process pool and await the result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), fn, *args)
+
+
+async def prewarm_process_pool(fn):
+    """Start every worker now and run fn once per worker (e.g. to import
+    what the jobs need), so the first real job does not pay for the spawn."""
+    await asyncio.gather(*(run_in_process(fn) for _ in range(PROCESS_POOL_WORKERS)))
+
+
+def shutdown_process_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -1,34 +1,15 @@
-from pymongo import MongoClient
+"""Repair LATITUDE/LONGITUDE values stored as strings in an existing database.
 
-client = MongoClient("mongodb://localhost:27017/")
-db = client["theft_db"]
-thefts_collection = db["thefts"]
- 
-def clean_coord(coord):
-    if coord is None:
-        return None
-     
-    coord_str = str(coord)
-     
-    cleaned = ''.join(c for c in coord_str if c.isdigit() or c in ['.', '-'])
-    try:
-        return float(cleaned)
-    except ValueError:
-        return None
+The batch job lives in backend/repair_coords.py; this wrapper keeps the old
+entry point working:
+    python pythonscripts.py [--chunk-size 5000] [--checkpoint FILE] [--reset]
+"""
+import os
+import sys
 
-all_records = thefts_collection.find()
-for record in all_records:
-    lat_str = record.get("LATITUDE")
-    lon_str = record.get("LONGITUDE")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
 
-    lat = clean_coord(lat_str)
-    lon = clean_coord(lon_str)
+from repair_coords import main  # noqa: E402
 
-    if lat is not None and lon is not None:
-        thefts_collection.update_one(
-            {"_id": record["_id"]},
-            {"$set": {"LATITUDE": lat, "LONGITUDE": lon}}
-        )
-        print(f"Updated: {record['_id']} -> {lat}, {lon}")
-    else:
-        print(f"Skipping: {record} Error: could not convert LAT/LON")
+if __name__ == "__main__":
+    main()